@@ -0,0 +1,184 @@
+import asyncio
+from datetime import date, datetime, timedelta
+import pandas as pd
+import firebase_admin
+from firebase_admin import firestore, firestore_async
+from KYC.metrics import stage, count_documents
+from KYC.reconciliation import reconcile_statement
+from KYC.kycchecker import (
+    MARGIN_TRADE_FIELDS, SURVEILLANCE_TRADE_FIELDS, todays_trade_window, build_margin_report,
+    flag_suspicious_trades, build_new_client_documents, build_settlement_entry
+)
+
+# --- 1. CONFIGURATION & SHARED ASYNC CLIENT ---
+# One AsyncClient per process; its gRPC channel is reused by every request. Setting
+# FIRESTORE_EMULATOR_HOST points it at the local emulator, same as the sync client.
+SCAN_PARTITIONS = 8          # Parallel partition queries for full-collection scans
+MAX_CONCURRENT_LOOKUPS = 32  # Per-client lookups in flight during the quarterly check
+
+_async_db = None
+
+def get_async_db():
+    """Returns the shared async Firestore client, creating it on first use."""
+    global _async_db
+    if _async_db is None:
+        try:
+            if not firebase_admin._apps:
+                firebase_admin.initialize_app()
+            _async_db = firestore_async.client()
+        except Exception as e:
+            print(f"❌ ASYNC FIRESTORE INITIALIZATION FAILED: {e}")
+            return None
+    return _async_db
+
+def set_async_db(client):
+    """Overrides the shared client (used to run against the in-memory stand-in)."""
+    global _async_db
+    _async_db = client
+
+# --- 2. SCAN HELPERS ---
+async def stream_query(query, stage_name, collection):
+    """Runs one query and returns its snapshots, recording time and document count."""
+    with stage(stage_name):
+        docs = [doc async for doc in query.stream()]
+    count_documents(stage_name, collection, len(docs))
+    return docs
+
+async def scan_collection(db, collection, fields=None, partitions=SCAN_PARTITIONS, stage_name=None):
+    """
+    Reads a whole collection as `partitions` parallel queries split on document-id
+    cursors, projected to `fields`. Partition cursors come from a collection-group
+    query, which is fine here because none of these collections are reused as
+    subcollection names. Falls back to a single stream if partitioning is unavailable.
+    """
+    stage_name = stage_name or f"db.{collection}_scan"
+    with stage(stage_name):
+        queries = []
+        if partitions > 1:
+            try:
+                queries = [partition.query() async for partition in db.collection_group(collection).get_partitions(partitions)]
+            except Exception as e:
+                print(f"Partitioned scan of '{collection}' unavailable, streaming instead: {e}")
+                queries = []
+        if not queries: queries = [db.collection(collection)]
+        if fields is not None: queries = [q.select(fields) for q in queries]
+
+        async def drain(query):
+            return [doc async for doc in query.stream()]
+        docs = [doc for chunk in await asyncio.gather(*(drain(q) for q in queries)) for doc in chunk]
+    count_documents(stage_name, collection, len(docs))
+    return docs
+
+# --- 3. ASYNC DATABASE FUNCTIONS ---
+# Same contracts as their kycchecker counterparts; CPU-heavy steps run in a worker thread
+# so the event loop keeps serving other requests.
+async def log_kyc_to_database_async(kyc_data):
+    db = get_async_db()
+    if not db: return
+    with stage("db.clients_count"):
+        # Aggregation query: the server counts index entries, no documents come back.
+        aggregate = await db.collection('clients').count().get()
+    # Building the documents includes the pandas risk-scoring pass, so it runs off the event loop.
+    new_client_id, client_doc_data, balance_doc_data = await asyncio.to_thread(build_new_client_documents, kyc_data, int(aggregate[0][0].value))
+    batch = db.batch()
+    batch.set(db.collection('clients').document(new_client_id), client_doc_data)
+    batch.set(db.collection('client_balances').document(new_client_id), balance_doc_data)
+    with stage("db.kyc_batch_commit"):
+        await batch.commit()
+    count_documents("db.kyc_batch_commit", "clients", 1)
+    count_documents("db.kyc_batch_commit", "client_balances", 1)
+    print(f"\n✅ KYC for {kyc_data.get('Name')} logged to Firestore. Client ID: {new_client_id}")
+
+async def check_client_funds_async(bank_statement_path):
+    db = get_async_db()
+    if not db: return {"status": "ERROR", "reason": "Firestore not connected."}
+    try:
+        docs = await scan_collection(db, 'client_balances', fields=['balance'], stage_name="db.client_balances_scan")
+        ledger_df = pd.DataFrame([{'client_id': doc.id, 'balance': doc.to_dict().get('balance', 0)} for doc in docs], columns=['client_id', 'balance'])
+        return await asyncio.to_thread(reconcile_statement, bank_statement_path, ledger_df)
+    except Exception as e:
+        return {"status": "ERROR", "reason": str(e)}
+
+async def get_expiring_kyc_async():
+    db = get_async_db()
+    if not db: return None, "Firestore not connected."
+    try:
+        today_iso = date.today().isoformat()
+        thirty_days_from_now_iso = (date.today() + timedelta(days=30)).isoformat()
+        query = db.collection('clients').where('kyc_expiry_date', '>=', today_iso).where('kyc_expiry_date', '<=', thirty_days_from_now_iso)
+        docs = await stream_query(query, "db.expiring_kyc_query", "clients")
+        return {"expiring_clients": [doc.to_dict() for doc in docs]}, None
+    except Exception as e:
+        return None, str(e)
+
+async def send_kyc_notification_async(client_id):
+    db = get_async_db()
+    if not db: return None, "Firestore not connected."
+    try:
+        with stage("db.client_lookup"):
+            client = await db.collection('clients').document(client_id).get(field_paths=['full_name'])
+        count_documents("db.client_lookup", "clients", 1 if client.exists else 0)
+        if client.exists:
+            client_name = client.to_dict().get('full_name', 'N/A')
+            print(f"--- SIMULATING NOTIFICATION to {client_name} (ID: {client_id}) ---")
+            return {"status": "success", "message": f"Notification sent to {client_name}."}, None
+        else:
+            return None, f"Client with ID '{client_id}' not found."
+    except Exception as e:
+        return None, str(e)
+
+async def _todays_trades(db, fields, stage_name):
+    start_of_day, end_of_day = todays_trade_window()
+    query = db.collection('trades').where('trade_date', '>=', start_of_day).where('trade_date', '<=', end_of_day).select(fields)
+    return [doc.to_dict() for doc in await stream_query(query, stage_name, "trades")]
+
+async def generate_margin_report_async():
+    db = get_async_db()
+    if not db: return None, "Firestore not connected."
+    try:
+        trades_list = await _todays_trades(db, MARGIN_TRADE_FIELDS, "db.margin_trades_query")
+        if not trades_list: return None, "No trades found for today in the Firestore database."
+        return await asyncio.to_thread(build_margin_report, trades_list), None
+    except Exception as e:
+        return None, str(e)
+
+async def run_surveillance_checks_async():
+    db = get_async_db()
+    if not db: return None, "Firestore not connected."
+    try:
+        trades_list = await _todays_trades(db, SURVEILLANCE_TRADE_FIELDS, "db.surveillance_trades_query")
+        flagged_trades = await asyncio.to_thread(flag_suspicious_trades, trades_list)
+        return {"status": "success", "flagged_trades": flagged_trades}, None
+    except Exception as e:
+        return None, str(e)
+
+async def run_quarterly_settlement_check_async():
+    """Looks up every funded client's last trade concurrently, then fetches idle clients' names in one batch read."""
+    db = get_async_db()
+    if not db: return None, "Firestore not connected."
+    try:
+        ninety_days_ago = datetime.now() - timedelta(days=90)
+        balance_docs = await stream_query(db.collection('client_balances').where('balance', '>', 0).select(['balance']), "db.positive_balances_query", "client_balances")
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_LOOKUPS)
+
+        async def last_trade_date(client_id):
+            async with semaphore:
+                query = db.collection('trades').where('client_id', '==', client_id).order_by('trade_date', direction=firestore.Query.DESCENDING).limit(1).select(['trade_date'])
+                docs = [doc async for doc in query.stream()]
+            return docs[0].to_dict()['trade_date'] if docs else None
+
+        with stage("db.last_trade_lookup"):
+            last_dates = await asyncio.gather(*(last_trade_date(doc.id) for doc in balance_docs))
+        count_documents("db.last_trade_lookup", "trades", sum(1 for d in last_dates if d is not None))
+
+        idle = [(doc.id, doc.to_dict().get('balance', 0), last) for doc, last in zip(balance_docs, last_dates) if last and last < ninety_days_ago]
+        names = {}
+        if idle:
+            with stage("db.client_lookup"):
+                refs = [db.collection('clients').document(client_id) for client_id, _, _ in idle]
+                async for snapshot in db.get_all(refs, field_paths=['full_name']):
+                    if snapshot.exists: names[snapshot.id] = snapshot.to_dict().get('full_name')
+        settlement_due_clients = [build_settlement_entry(client_id, names[client_id], balance, last) for client_id, balance, last in idle if client_id in names]
+        return {"status": "success", "settlement_due_clients": settlement_due_clients}, None
+    except Exception as e:
+        return None, str(e)
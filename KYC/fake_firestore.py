@@ -0,0 +1,494 @@
+import time
+import uuid
+import asyncio
+import random
+import threading
+import copy
+from datetime import date, timedelta, datetime, timezone
+import numpy as np
+
+# An in-memory stand-in for the subset of the Firestore client API used in this repo.
+# It lets benchmarks and the load tester exercise kycchecker without a live project:
+#   import KYC.kycchecker as kyc; kyc.db = FakeFirestore(); seed_synthetic_data(kyc.db)
+# `latency` adds a simulated round trip to every RPC (stream/get/commit) and
+# `field_latency` a transfer cost per field returned, so projection shows up in benchmarks.
+# FakeAsyncFirestore wraps the same store with the AsyncClient surface used by KYC.async_db.
+
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+MAX_BATCH_OPS = 500
+
+_OPERATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "in": lambda a, b: a in b,
+    "not-in": lambda a, b: a not in b,
+    "array-contains": lambda a, b: isinstance(a, list) and b in a,
+}
+
+# --- 1. FIELD TRANSFORMS (SERVER_TIMESTAMP, Increment, Maximum, ...) ---
+def _apply_value(current, value):
+    """Resolves Firestore sentinels and numeric transforms against the stored value."""
+    kind = type(value).__name__
+    if kind == "Sentinel":
+        description = getattr(value, "description", "").lower()
+        if "delete" in description: return _DELETE
+        return datetime.now(timezone.utc)  # Firestore hands back server timestamps as aware UTC
+    if kind in ("Increment", "Maximum", "Minimum") and hasattr(value, "value"):
+        operand = value.value
+        if not isinstance(current, (int, float)): return operand
+        if kind == "Increment": return current + operand
+        if kind == "Maximum": return max(current, operand)
+        return min(current, operand)
+    return copy.deepcopy(value)
+
+_DELETE = object()
+
+def _merge_fields(existing, data):
+    for field, value in data.items():
+        resolved = _apply_value(existing.get(field), value)
+        if resolved is _DELETE: existing.pop(field, None)
+        else: existing[field] = resolved
+    return existing
+
+# --- 2. DOCUMENTS ---
+class FakeDocumentSnapshot:
+    def __init__(self, reference, data, fields=None):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+        self._fields = fields
+
+    def to_dict(self):
+        if self._data is None: return None
+        if self._fields is None: return copy.copy(self._data)
+        return {f: self._data[f] for f in self._fields if f in self._data}
+
+    def get(self, field):
+        return self._data.get(field) if self._data else None
+
+class FakeDocumentReference:
+    def __init__(self, client, collection_name, doc_id):
+        self._client = client
+        self._collection_name = collection_name
+        self.id = doc_id
+
+    def get(self, field_paths=None):
+        data = self._client._store.get(self._collection_name, {}).get(self.id)
+        self._client._round_trip(self._client._fields_returned([data] if data else [], field_paths))
+        return FakeDocumentSnapshot(self, data, field_paths)
+
+    def set(self, data, merge=False):
+        self._client._round_trip()
+        self._client._write(self._collection_name, self.id, data, merge)
+
+    def update(self, data):
+        self._client._round_trip()
+        if self.id not in self._client._store.get(self._collection_name, {}):
+            raise KeyError(f"No document to update: {self._collection_name}/{self.id}")
+        self._client._write(self._collection_name, self.id, data, True)
+
+    def delete(self):
+        self._client._round_trip()
+        self._client._delete(self._collection_name, self.id)
+
+# --- 3. QUERIES ---
+class FakeQuery:
+    def __init__(self, client, collection_name, filters=(), orders=(), limit_count=None, fields=None, id_range=None):
+        self._client = client
+        self._collection_name = collection_name
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit_count
+        self._fields = fields
+        self._id_range = id_range
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, orders=self._orders, limit_count=self._limit, fields=self._fields, id_range=self._id_range)
+        state.update(changes)
+        return FakeQuery(self._client, self._collection_name, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if op_string not in _OPERATORS: raise ValueError(f"Unsupported operator: {op_string}")
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction=ASCENDING):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copy(limit_count=count)
+
+    def select(self, field_paths):
+        return self._copy(fields=list(field_paths))
+
+    def _matching_ids(self):
+        docs = self._client._store.get(self._collection_name, {})
+        filters = list(self._filters)
+        equality = next((f for f in filters if f[1] == "=="), None)
+        if equality is not None:
+            filters.remove(equality)
+            candidates = self._client._index(self._collection_name, equality[0]).get(equality[2], ())
+        else:
+            candidates = docs.keys()
+        if self._id_range is not None:
+            lower, upper = self._id_range
+            candidates = [d for d in candidates if (lower is None or d >= lower) and (upper is None or d < upper)]
+        matched = []
+        for doc_id in candidates:
+            data = docs[doc_id]
+            try:
+                if all(field in data and _OPERATORS[op](data[field], value) for field, op, value in filters):
+                    matched.append(doc_id)
+            except TypeError:
+                continue
+        for field, direction in reversed(self._orders):
+            matched = [d for d in matched if field in docs[d]]
+            matched.sort(key=lambda d: docs[d][field], reverse=(direction == DESCENDING))
+        if self._limit is not None: matched = matched[:self._limit]
+        return matched
+
+    def _snapshots(self):
+        docs = self._client._store.get(self._collection_name, {})
+        return [FakeDocumentSnapshot(FakeDocumentReference(self._client, self._collection_name, doc_id), docs[doc_id], self._fields) for doc_id in self._matching_ids()]
+
+    def stream(self):
+        snapshots = self._snapshots()
+        self._client._round_trip(self._client._fields_returned([s._data for s in snapshots], self._fields))
+        yield from snapshots
+
+    def get(self):
+        return list(self.stream())
+
+    def count(self, alias=None):
+        return FakeAggregateQuery(self, alias)
+
+class FakeAggregationResult:
+    def __init__(self, alias, value):
+        self.alias = alias
+        self.value = value
+
+class FakeAggregateQuery:
+    """count() aggregation: one round trip and no documents transferred."""
+    def __init__(self, query, alias=None):
+        self._query = query
+        self._alias = alias or "field_1"
+
+    def _results(self):
+        return [[FakeAggregationResult(self._alias, len(self._query._matching_ids()))]]
+
+    def get(self):
+        self._query._client._round_trip()
+        return self._results()
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client, name):
+        super().__init__(client, name)
+        self.id = name
+
+    def document(self, document_id=None):
+        return FakeDocumentReference(self._client, self._collection_name, document_id or uuid.uuid4().hex[:20])
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return datetime.now(), ref
+
+# --- 4. BATCHES & CLIENT ---
+class AlreadyExists(Exception):
+    """Raised by a batch `create` of an existing document; named like google.api_core's so callers can match on it."""
+
+class FakeWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def _queue(self, op):
+        if len(self._ops) >= MAX_BATCH_OPS: raise ValueError(f"Batch exceeds {MAX_BATCH_OPS} operations.")
+        self._ops.append(op)
+
+    def set(self, reference, data, merge=False):
+        self._queue(("set", reference, data, merge))
+
+    def create(self, reference, data):
+        self._queue(("create", reference, data, False))
+
+    def update(self, reference, data):
+        self._queue(("set", reference, data, True))
+
+    def delete(self, reference):
+        self._queue(("delete", reference, None, False))
+
+    def __len__(self):
+        return len(self._ops)
+
+    def commit(self):
+        self._client._round_trip()
+        return self._apply()
+
+    def _apply(self):
+        with self._client._lock:
+            # Like Firestore, one existing document fails the whole batch before anything is written.
+            for kind, ref, data, merge in self._ops:
+                if kind == "create" and ref.id in self._client._store.get(ref._collection_name, {}):
+                    raise AlreadyExists(f"Document already exists: {ref._collection_name}/{ref.id}")
+            for kind, ref, data, merge in self._ops:
+                if kind == "delete": self._client._delete(ref._collection_name, ref.id)
+                else: self._client._write(ref._collection_name, ref.id, data, merge)
+        committed = len(self._ops)
+        self._ops = []
+        return [None] * committed
+
+class FakeFirestore:
+    def __init__(self, latency=0.0, field_latency=0.0):
+        self.latency = latency
+        self.field_latency = field_latency
+        self._store = {}
+        self._indexes = {}
+        self._version = {}
+        self._lock = threading.RLock()  # Batches commit atomically even from parallel writer threads
+
+    def _fields_returned(self, documents, fields):
+        if not self.field_latency: return 0
+        if fields is not None: return len(documents) * len(fields)
+        return sum(len(d) for d in documents)
+
+    def _cost(self, fields_returned):
+        return self.latency + fields_returned * self.field_latency
+
+    def _round_trip(self, fields_returned=0):
+        cost = self._cost(fields_returned)
+        if cost: time.sleep(cost)
+
+    def _touch(self, collection_name):
+        self._version[collection_name] = self._version.get(collection_name, 0) + 1
+
+    def _write(self, collection_name, doc_id, data, merge):
+        docs = self._store.setdefault(collection_name, {})
+        existing = docs.get(doc_id) if merge else None
+        docs[doc_id] = _merge_fields(dict(existing or {}), data)
+        self._touch(collection_name)
+
+    def _delete(self, collection_name, doc_id):
+        self._store.get(collection_name, {}).pop(doc_id, None)
+        self._touch(collection_name)
+
+    def _index(self, collection_name, field):
+        """Equality index per field, rebuilt lazily after writes to keep lookups O(1)."""
+        key = (collection_name, field)
+        version = self._version.get(collection_name, 0)
+        cached = self._indexes.get(key)
+        if cached and cached[0] == version: return cached[1]
+        index = {}
+        for doc_id, data in self._store.get(collection_name, {}).items():
+            if field in data:
+                try: index.setdefault(data[field], []).append(doc_id)
+                except TypeError: continue
+        self._indexes[key] = (version, index)
+        return index
+
+    def collection(self, name):
+        return FakeCollectionReference(self, name)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def get_all(self, references, field_paths=None):
+        references = list(references)
+        documents = [self._store.get(ref._collection_name, {}).get(ref.id) for ref in references]
+        self._round_trip(self._fields_returned([d for d in documents if d], field_paths))
+        for ref, data in zip(references, documents):
+            yield FakeDocumentSnapshot(ref, data, field_paths)
+
+    def count(self, collection_name):
+        return len(self._store.get(collection_name, {}))
+
+# --- 5. ASYNC FACADE ---
+class FakeAsyncQuery:
+    def __init__(self, query):
+        self._query = query
+
+    def where(self, *args, **kwargs): return FakeAsyncQuery(self._query.where(*args, **kwargs))
+    def order_by(self, *args, **kwargs): return FakeAsyncQuery(self._query.order_by(*args, **kwargs))
+    def limit(self, count): return FakeAsyncQuery(self._query.limit(count))
+    def select(self, field_paths): return FakeAsyncQuery(self._query.select(field_paths))
+    def count(self, alias=None): return FakeAsyncAggregateQuery(self._query.count(alias))
+
+    async def stream(self):
+        client = self._query._client
+        snapshots = self._query._snapshots()
+        cost = client._cost(client._fields_returned([s._data for s in snapshots], self._query._fields))
+        if cost: await asyncio.sleep(cost)
+        for snapshot in snapshots:
+            yield snapshot
+
+    async def get(self):
+        return [snapshot async for snapshot in self.stream()]
+
+class FakeAsyncAggregateQuery:
+    def __init__(self, aggregate):
+        self._aggregate = aggregate
+
+    async def get(self):
+        latency = self._aggregate._query._client.latency
+        if latency: await asyncio.sleep(latency)
+        return self._aggregate._results()
+
+class FakeAsyncDocumentReference:
+    def __init__(self, reference):
+        self._reference = reference
+        self.id = reference.id
+
+    async def get(self, field_paths=None):
+        client = self._reference._client
+        data = client._store.get(self._reference._collection_name, {}).get(self.id)
+        cost = client._cost(client._fields_returned([data] if data else [], field_paths))
+        if cost: await asyncio.sleep(cost)
+        return FakeDocumentSnapshot(self._reference, data, field_paths)
+
+    async def set(self, data, merge=False):
+        if self._reference._client.latency: await asyncio.sleep(self._reference._client.latency)
+        self._reference._client._write(self._reference._collection_name, self.id, data, merge)
+
+class FakeAsyncCollectionReference(FakeAsyncQuery):
+    def __init__(self, client, name):
+        super().__init__(FakeCollectionReference(client, name))
+        self.id = name
+
+    def document(self, document_id=None):
+        return FakeAsyncDocumentReference(self._query.document(document_id))
+
+class FakeQueryPartition:
+    def __init__(self, client, collection_name, lower, upper):
+        self._client, self._collection_name, self.start_at, self.end_at = client, collection_name, lower, upper
+
+    def query(self):
+        return FakeAsyncQuery(FakeQuery(self._client, self._collection_name, id_range=(self.start_at, self.end_at)))
+
+class FakeAsyncCollectionGroup(FakeAsyncQuery):
+    def __init__(self, client, name):
+        super().__init__(FakeQuery(client, name))
+
+    async def get_partitions(self, partition_count):
+        """Splits the collection by document id, like Firestore's partition cursors."""
+        client, name = self._query._client, self._query._collection_name
+        if client.latency: await asyncio.sleep(client.latency)
+        ids = sorted(client._store.get(name, {}))
+        step = max(1, -(-len(ids) // max(partition_count, 1)))
+        cursors = ids[step::step]
+        for lower, upper in zip([None] + cursors, cursors + [None]):
+            yield FakeQueryPartition(client, name, lower, upper)
+
+class FakeAsyncWriteBatch(FakeWriteBatch):
+    def set(self, reference, data, merge=False):
+        super().set(getattr(reference, "_reference", reference), data, merge)
+
+    def create(self, reference, data):
+        super().create(getattr(reference, "_reference", reference), data)
+
+    def update(self, reference, data):
+        super().update(getattr(reference, "_reference", reference), data)
+
+    def delete(self, reference):
+        super().delete(getattr(reference, "_reference", reference))
+
+    async def commit(self):
+        # The round trip is awaited here, so only the write itself runs synchronously.
+        if self._client.latency: await asyncio.sleep(self._client.latency)
+        return self._apply()
+
+class FakeAsyncFirestore:
+    """Async view over a FakeFirestore store, so sync and async code see the same data."""
+    def __init__(self, sync_client):
+        self._client = sync_client
+
+    def collection(self, name):
+        return FakeAsyncCollectionReference(self._client, name)
+
+    def collection_group(self, name):
+        return FakeAsyncCollectionGroup(self._client, name)
+
+    def batch(self):
+        return FakeAsyncWriteBatch(self._client)
+
+    async def get_all(self, references, field_paths=None):
+        references = list(references)
+        cost = self._client._cost(sum(len(field_paths) if field_paths is not None else len(self._client._store.get(ref._reference._collection_name, {}).get(ref.id) or {}) for ref in references) if self._client.field_latency else 0)
+        if cost: await asyncio.sleep(cost)
+        for ref in references:
+            data = self._client._store.get(ref._reference._collection_name, {}).get(ref.id)
+            yield FakeDocumentSnapshot(ref._reference, data, field_paths)
+
+# --- 6. SYNTHETIC DATA ---
+def seed_synthetic_data(db, num_clients=100, simulation_days=180, trades_per_day_per_client=0.5, seed=42):
+    """
+    Loads clients, balances and trades shaped like data_generator.py into `db`, directly
+    into the in-memory store so large sizes seed quickly. Today always gets trades, a few
+    of them above the Rs 5 lakh surveillance threshold, and ~10% of clients go idle early
+    so the quarterly settlement check has work to do.
+    """
+    rng = np.random.default_rng(seed)
+    py_rng = random.Random(seed)
+    today = date.today()
+    clients, balances, trades = {}, {}, {}
+
+    onboarding_day_ago = rng.integers(1, simulation_days + 1, size=num_clients)
+    idle_after_day_ago = np.where(rng.random(num_clients) < 0.1, rng.integers(91, max(simulation_days, 92) + 1, size=num_clients), 0)
+    for i in range(num_clients):
+        client_id = f"CL{1001 + i}"
+        onboarded = today - timedelta(days=int(onboarding_day_ago[i]))
+        clients[client_id] = {
+            'client_id': client_id, 'full_name': f"CLIENT {1001 + i}",
+            'pan_number': ''.join(py_rng.choices("ABCDEFGHIJKLMNOPQRSTUVWXYZ", k=5)) + f"{i % 10000:04d}" + "Z",
+            'dob': (date(1960, 1, 1) + timedelta(days=int(rng.integers(0, 16000)))).isoformat(),
+            'address': "123, Sample St, Mumbai", 'kyc_last_updated': onboarded.isoformat(),
+            'kyc_expiry_date': (onboarded + timedelta(days=8*365 - int(rng.integers(0, 8*365)))).isoformat(),
+            'risk_category': 'Medium'
+        }
+        balances[client_id] = {'balance': round(float(rng.uniform(50000, 200000)), 2), 'last_updated': datetime.combine(onboarded, datetime.min.time())}
+
+    symbols = np.array(["RELIANCE", "TCS", "HDFCBANK", "INFY", "ICICIBANK", "SUZLON", "YESBANK"])
+    for day_ago in range(simulation_days, -1, -1):
+        trade_datetime = datetime.combine(today - timedelta(days=day_ago), datetime.min.time())
+        active = np.flatnonzero((onboarding_day_ago >= day_ago) & ((idle_after_day_ago == 0) | (idle_after_day_ago < day_ago)))
+        if day_ago == 0 and active.size == 0: active = np.arange(num_clients)
+        if active.size == 0: continue
+        n = max(int(active.size * trades_per_day_per_client), 1)
+        picked = rng.choice(active, size=n)
+        stock = rng.choice(symbols, size=n)
+        quantity = rng.integers(10, 500, size=n)
+        price = np.round(rng.uniform(500, 3000, size=n), 2)
+        trade_type = rng.choice(np.array(["BUY", "SELL"]), size=n)
+        for j in range(n):
+            trades[uuid.UUID(int=py_rng.getrandbits(128)).hex[:20]] = {
+                'client_id': f"CL{1001 + int(picked[j])}", 'trade_date': trade_datetime,
+                'stock_symbol': str(stock[j]), 'trade_type': str(trade_type[j]),
+                'quantity': int(quantity[j]), 'price_per_share': float(price[j])
+            }
+        if day_ago == 0:
+            for j in range(max(n // 50, 1)):
+                trades[uuid.UUID(int=py_rng.getrandbits(128)).hex[:20]] = {
+                    'client_id': f"CL{1001 + int(picked[j])}", 'trade_date': trade_datetime,
+                    'stock_symbol': "INFY", 'trade_type': "SELL", 'quantity': 300 + j, 'price_per_share': 1800.0
+                }
+
+    for name, docs in (("clients", clients), ("client_balances", balances), ("trades", trades)):
+        db._store.setdefault(name, {}).update(docs)
+        db._touch(name)
+    return {"clients": len(clients), "client_balances": len(balances), "trades": len(trades)}
+
+def seeded_firestore(latency=0.0, **seed_kwargs):
+    """
+    A FakeFirestore loaded by seed_synthetic_data. Seeding is deterministic, so
+    functools.partial(seeded_firestore, ...) works as a picklable db_factory for
+    spawned worker processes: each one rebuilds the same data.
+    """
+    db = FakeFirestore(latency=latency)
+    seed_synthetic_data(db, **seed_kwargs)
+    return db
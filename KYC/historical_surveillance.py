@@ -0,0 +1,192 @@
+import os
+import time
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, timedelta, datetime
+import pandas as pd
+from KYC.metrics import stage, count_documents
+
+# --- 1. CONFIGURATION ---
+PARTITION_DAYS = 7             # Days of trades fetched and evaluated by one worker task
+MAX_LOOKBACK_DAYS = 365
+LARGE_TRADE_VALUE = 500000     # Rs 5 lakh, same threshold as the daily check
+PENNY_STOCK_PRICE = 10         # Price below which a stock counts as a penny stock
+PENNY_STOCK_VOLUME = 100000    # Shares in one penny-stock trade
+HIGH_FREQUENCY_TRADES = 50     # Trades by one client in one stock on one day
+WASH_TRADE_MIN_TRADES = 10     # Matched buys/sells needed before the window looks like wash trading
+TRADE_FIELDS = ['client_id', 'stock_symbol', 'trade_type', 'quantity', 'price_per_share', 'trade_date']
+
+# Each worker process opens its own Firestore client; gRPC channels don't survive fork,
+# so the default start method is spawn. Pools are created on first use and kept for the
+# life of the process (see shutdown_worker_pools), so requests don't pay process startup
+# and concurrent requests share the same bounded set of workers.
+_worker_db = None
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _firestore_client():
+    import firebase_admin
+    from firebase_admin import firestore
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app()
+    return firestore.client()
+
+def _init_worker(db_factory):
+    global _worker_db
+    _worker_db = db_factory()
+
+def _worker_pool(workers, db_factory, mp_context):
+    key = (workers, db_factory, mp_context)
+    with _pools_lock:
+        if key not in _pools:
+            context = multiprocessing.get_context(mp_context)
+            _pools[key] = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(db_factory,))
+        return _pools[key]
+
+def _discard_pool(pool):
+    with _pools_lock:
+        for key, cached in list(_pools.items()):
+            if cached is pool: del _pools[key]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def shutdown_worker_pools():
+    """Stops the cached worker pools; call at application shutdown."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+# --- 2. PER-PARTITION SCAN (runs inside the worker) ---
+def _empty_frame(columns):
+    return pd.DataFrame({c: pd.Series(dtype=object) for c in columns})
+
+def scan_partition(start, end, db=None):
+    """
+    Fetches trades in [start, end) and evaluates them. Single-trade rules are finished here;
+    rules that span days return partial aggregates that merge_partitions() adds up.
+    """
+    db = db or _worker_db
+    query = db.collection('trades').where('trade_date', '>=', start).where('trade_date', '<', end).select(TRADE_FIELDS)
+    return evaluate_trades(pd.DataFrame([doc.to_dict() for doc in query.stream()], columns=TRADE_FIELDS))
+
+def evaluate_trades(df):
+    """Evaluates an in-memory frame of trades (TRADE_FIELDS) into a partial result for merge_partitions()."""
+    df = df.copy()
+    partial = {"trades_scanned": len(df)}
+    if df.empty:
+        partial["trade_flags"] = _empty_frame(['client_id', 'stock_symbol', 'reason', 'trade_day'])
+        partial["daily_counts"] = _empty_frame(['client_id', 'stock_symbol', 'trade_day', 'trade_count'])
+        partial["window_totals"] = _empty_frame(['client_id', 'stock_symbol', 'trade_count', 'buy_qty', 'sell_qty'])
+        return partial
+
+    df['trade_day'] = pd.to_datetime(df['trade_date']).dt.strftime('%Y-%m-%d')
+    df['trade_value'] = df['quantity'] * df['price_per_share']
+    large = df.loc[df['trade_value'] > LARGE_TRADE_VALUE, ['client_id', 'stock_symbol', 'trade_day']].assign(reason="Large Trade Value")
+    penny = df.loc[(df['price_per_share'] < PENNY_STOCK_PRICE) & (df['quantity'] > PENNY_STOCK_VOLUME), ['client_id', 'stock_symbol', 'trade_day']].assign(reason="High Volume in Penny Stock")
+    partial["trade_flags"] = pd.concat([large, penny], ignore_index=True)
+
+    partial["daily_counts"] = df.groupby(['client_id', 'stock_symbol', 'trade_day'], as_index=False).size().rename(columns={'size': 'trade_count'})
+    df['buy_qty'] = df['quantity'].where(df['trade_type'] == 'BUY', 0)
+    df['sell_qty'] = df['quantity'].where(df['trade_type'] == 'SELL', 0)
+    partial["window_totals"] = df.groupby(['client_id', 'stock_symbol'], as_index=False).agg(
+        trade_count=('quantity', 'size'), buy_qty=('buy_qty', 'sum'), sell_qty=('sell_qty', 'sum'))
+    return partial
+
+# --- 3. MERGING PARTITION RESULTS ---
+def merge_partitions(partials):
+    """Combines partition results and evaluates the rules that need the whole window."""
+    flags = [p["trade_flags"] for p in partials if not p["trade_flags"].empty]
+
+    daily = pd.concat([p["daily_counts"] for p in partials], ignore_index=True)
+    if not daily.empty:
+        # Sum before thresholding so a day split across partitions is still counted once.
+        daily = daily.groupby(['client_id', 'stock_symbol', 'trade_day'], as_index=False)['trade_count'].sum()
+        busy = daily.loc[daily['trade_count'] > HIGH_FREQUENCY_TRADES, ['client_id', 'stock_symbol', 'trade_day']]
+        flags.append(busy.assign(reason="High Frequency Trading"))
+
+    totals = pd.concat([p["window_totals"] for p in partials], ignore_index=True)
+    if not totals.empty:
+        totals = totals.groupby(['client_id', 'stock_symbol'], as_index=False)[['trade_count', 'buy_qty', 'sell_qty']].sum()
+        wash = totals.loc[(totals['buy_qty'] > 0) & (totals['buy_qty'] == totals['sell_qty']) & (totals['trade_count'] >= WASH_TRADE_MIN_TRADES), ['client_id', 'stock_symbol']]
+        # Window-level rules have no single day; report them against the last day that client traded the stock.
+        last_day = daily.groupby(['client_id', 'stock_symbol'], as_index=False)['trade_day'].max()
+        flags.append(wash.merge(last_day, on=['client_id', 'stock_symbol'], how='left').assign(reason="Possible Wash Trading"))
+
+    if not flags:
+        return []
+    merged = pd.concat(flags, ignore_index=True)
+    merged = merged.groupby(['client_id', 'stock_symbol', 'reason'], as_index=False).agg(
+        first_seen=('trade_day', 'min'), last_seen=('trade_day', 'max'), occurrences=('trade_day', 'size'))
+    return merged.sort_values(['client_id', 'stock_symbol', 'reason']).to_dict('records')
+
+def date_partitions(start_date, end_date, partition_days=PARTITION_DAYS):
+    """Splits [start_date, end_date] (inclusive dates) into half-open datetime ranges."""
+    bounds = []
+    cursor = datetime.combine(start_date, datetime.min.time())
+    stop = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+    while cursor < stop:
+        upper = min(cursor + timedelta(days=partition_days), stop)
+        bounds.append((cursor, upper))
+        cursor = upper
+    return bounds
+
+# --- 4. PUBLIC ENTRY POINT ---
+def run_historical_surveillance(start_date, end_date, partition_days=PARTITION_DAYS, max_workers=None, db=None, db_factory=_firestore_client, mp_context="spawn"):
+    """
+    Runs the surveillance rules over a date range by scanning date partitions in parallel.
+    With one worker (max_workers=1, a single partition or a single CPU) the partitions are
+    scanned in-process against `db`, or a client from `db_factory` if none is given.
+    Otherwise they run on a long-lived process pool of `max_workers` (default: CPU count)
+    whose workers each open a client with `db_factory`, which must be picklable. A `db`
+    can't be sent to worker processes, so passing one with more than one worker is an error.
+    Returns (result, error) like the other compliance checks.
+    """
+    if start_date > end_date: return None, "start_date must be on or before end_date."
+    if (end_date - start_date).days + 1 > MAX_LOOKBACK_DAYS: return None, f"Date range cannot exceed {MAX_LOOKBACK_DAYS} days."
+    try:
+        start = time.perf_counter()
+        partitions = date_partitions(start_date, end_date, partition_days)
+        pool_size = max_workers or os.cpu_count() or 1
+        workers = min(len(partitions), pool_size)
+        if db is not None and workers > 1:
+            return None, "A db client can't be shared with worker processes; pass a picklable db_factory or max_workers=1."
+        with stage("surveillance.historical.scan"):
+            if workers == 1:
+                db = db or db_factory()
+                partials = [scan_partition(lower, upper, db) for lower, upper in partitions]
+            else:
+                pool = _worker_pool(pool_size, db_factory, mp_context)
+                try:
+                    partials = list(pool.map(scan_partition, *zip(*partitions)))
+                except BrokenProcessPool:
+                    _discard_pool(pool)  # A crashed worker poisons the pool; the next run starts a fresh one
+                    raise
+        trades_scanned = sum(p["trades_scanned"] for p in partials)
+        count_documents("surveillance.historical.scan", "trades", trades_scanned)
+        with stage("surveillance.historical.merge"):
+            flagged_trades = merge_partitions(partials)
+        return {
+            "status": "success", "start_date": start_date.isoformat(), "end_date": end_date.isoformat(),
+            "partitions": len(partitions), "workers": workers, "trades_scanned": trades_scanned,
+            "elapsed_seconds": round(time.perf_counter() - start, 3), "flagged_trades": flagged_trades
+        }, None
+    except Exception as e:
+        return None, str(e)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run surveillance rules over a historical lookback window.")
+    parser.add_argument("--days", type=int, default=90, help="Lookback window in days, ending today.")
+    parser.add_argument("--partition-days", type=int, default=PARTITION_DAYS)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    result, error = run_historical_surveillance(date.today() - timedelta(days=args.days - 1), date.today(), args.partition_days, args.workers)
+    if error:
+        print(f"❌ Historical surveillance failed: {error}")
+    else:
+        print(f"Scanned {result['trades_scanned']:,} trades in {result['partitions']} partitions with {result['workers']} worker(s) in {result['elapsed_seconds']}s")
+        for flag in result["flagged_trades"]:
+            print(f"  {flag['client_id']:<8} {flag['stock_symbol']:<12} {flag['reason']:<28} {flag['first_seen']} -> {flag['last_seen']} ({flag['occurrences']}x)")
@@ -11,8 +11,11 @@ from deepface import DeepFace
 from cryptography.fernet import Fernet
 from fpdf import FPDF
 import random
+import tempfile
 import firebase_admin
 from firebase_admin import credentials, firestore
+from KYC.metrics import stage
+from KYC.risk_scoring import score_new_client
 
 # --- 1. CONFIGURATION & FIREBASE INITIALIZATION ---
 
@@ -42,48 +45,45 @@ def setup_database():
     if db: print("Firestore connection is active. No setup needed for schemaless DB.")
     else: print("Firestore connection is not available.")
 
-def log_kyc_to_database(kyc_data):
-    """Logs verified KYC data and synthesizes a dynamic profile in Firestore."""
-    if not db: return
-
-    clients_ref = db.collection('clients')
-    client_count = len(list(clients_ref.stream()))
+def build_new_client_documents(kyc_data, client_count):
+    """Builds the client profile and opening balance documents for a newly verified client."""
     new_client_id = f"CL{1001 + client_count}"
     today_iso = date.today().isoformat()
     expiry_iso = (date.today() + timedelta(days=8*365)).isoformat()
-    
     client_doc_data = {
         'client_id': new_client_id, 'full_name': kyc_data.get("Name", "N/A"),
         'pan_number': kyc_data.get("PAN Number", "N/A"), 'dob': kyc_data.get("Date of Birth"),
         'address': kyc_data.get("Address", "N/A"), 'kyc_last_updated': today_iso,
-        'kyc_expiry_date': expiry_iso, 'risk_category': 'Medium'
+        'kyc_expiry_date': expiry_iso
     }
-    
-    batch = db.batch()
-    client_ref = clients_ref.document(new_client_id)
-    batch.set(client_ref, client_doc_data)
-    balance_ref = db.collection('client_balances').document(new_client_id)
-    batch.set(balance_ref, {
+    # Scored from the KYC fields straight away; the batch job rescores once trades arrive.
+    client_doc_data.update(score_new_client(client_doc_data))
+    balance_doc_data = {
         'balance': round(random.uniform(50000, 200000), 2),
         'last_updated': firestore.SERVER_TIMESTAMP
-    })
-    batch.commit()
-    print(f"\n✅ KYC for {kyc_data.get('Name')} logged to Firestore. Client ID: {new_client_id}")
+    }
+    return new_client_id, client_doc_data, balance_doc_data
 
 # --- 3. LOCAL KYC PROCESSING ENGINE (Unchanged) ---
 def process_local_kyc(selfie_path, pan_path, aadhaar_front_path, aadhaar_back_path, user_name_input):
     try:
-        face_result = DeepFace.verify(img1_path=selfie_path, img2_path=aadhaar_front_path, model_name="VGG-Face", enforce_detection=False)
+        with stage("kyc.face_verify"):
+            face_result = DeepFace.verify(img1_path=selfie_path, img2_path=aadhaar_front_path, model_name="VGG-Face", enforce_detection=False)
         if not face_result.get("verified", False): return {"status": "failed", "reason": "Face verification failed."}
     except Exception as e: return {"status": "failed", "reason": f"DeepFace error: {e}"}
-    aadhaar_text = extract_text_from_image(aadhaar_front_path)
-    extracted_name = find_name_on_aadhaar(aadhaar_text)
+    with stage("kyc.ocr.aadhaar_front"):
+        aadhaar_text = extract_text_from_image(aadhaar_front_path)
+    with stage("kyc.parse.name"):
+        extracted_name = find_name_on_aadhaar(aadhaar_text)
     if not extracted_name or user_name_input.lower() != extracted_name.lower(): return {"status": "failed", "reason": f"Name verification failed."}
-    pan_text = extract_text_from_image(pan_path)
-    aadhaar_back_text = extract_text_from_image(aadhaar_back_path)
-    pan_details = parse_other_details(pan_text)
-    aadhaar_front_details = parse_other_details(aadhaar_text)
-    aadhaar_back_details = parse_other_details(aadhaar_back_text)
+    with stage("kyc.ocr.pan"):
+        pan_text = extract_text_from_image(pan_path)
+    with stage("kyc.ocr.aadhaar_back"):
+        aadhaar_back_text = extract_text_from_image(aadhaar_back_path)
+    with stage("kyc.parse.details"):
+        pan_details = parse_other_details(pan_text)
+        aadhaar_front_details = parse_other_details(aadhaar_text)
+        aadhaar_back_details = parse_other_details(aadhaar_back_text)
     final_data = {
         "Name": user_name_input.upper(), "Date of Birth": aadhaar_front_details["Date of Birth"] or pan_details["Date of Birth"],
         "PAN Number": pan_details["PAN Number"], "Address": aadhaar_back_details["Address"],
@@ -118,93 +118,61 @@ def mask_number(number, visible_digits=4):
     if number is None or len(number) <= visible_digits: return number
     return "X" * (len(number) - visible_digits) + number[-visible_digits:]
 
-# --- 4. DATABASE-DRIVEN COMPLIANCE FUNCTIONS ---
-def check_client_funds_from_db(bank_statement_path):
-    if not db: return {"status": "ERROR", "reason": "Firestore not connected."}
-    try:
-        balances_ref = db.collection('client_balances').stream()
-        total_required_funds = sum(doc.to_dict().get('balance', 0) for doc in balances_ref if doc.to_dict().get('balance', 0) > 0)
-        bank_df = pd.read_csv(bank_statement_path)
-        actual_bank_balance = bank_df['balance'].iloc[0]
-        if actual_bank_balance >= total_required_funds:
-            return {"status": "PASS", "surplus": f"{actual_bank_balance - total_required_funds:,.2f}"}
-        else:
-            return {"status": "FAIL", "shortfall": f"{total_required_funds - actual_bank_balance:,.2f}"}
-    except Exception as e:
-        return {"status": "ERROR", "reason": str(e)}
-
-def get_expiring_kyc_from_db():
-    if not db: return None, "Firestore not connected."
-    try:
-        today_iso = date.today().isoformat()
-        thirty_days_from_now_iso = (date.today() + timedelta(days=30)).isoformat()
-        expiring_clients_query = db.collection('clients').where('kyc_expiry_date', '>=', today_iso).where('kyc_expiry_date', '<=', thirty_days_from_now_iso).stream()
-        expiring_list = [doc.to_dict() for doc in expiring_clients_query]
-        return {"expiring_clients": expiring_list}, None
-    except Exception as e:
-        return None, str(e)
-
-def send_kyc_notification(client_id):
-    if not db: return None, "Firestore not connected."
-    try:
-        client_ref = db.collection('clients').document(client_id)
-        client = client_ref.get()
-        if client.exists:
-            client_name = client.to_dict().get('full_name', 'N/A')
-            print(f"--- SIMULATING NOTIFICATION to {client_name} (ID: {client_id}) ---")
-            return {"status": "success", "message": f"Notification sent to {client_name}."}, None
-        else:
-            return None, f"Client with ID '{client_id}' not found."
-    except Exception as e:
-        return None, str(e)
-
-def generate_margin_report_from_db():
-    if not db: return None, "Firestore not connected."
-    try:
-        today = date.today()
-        start_of_day = datetime.combine(today, datetime.min.time())
-        end_of_day = datetime.combine(today, datetime.max.time())
-        trades_query = db.collection('trades').where('trade_date', '>=', start_of_day).where('trade_date', '<=', end_of_day).stream()
-        trades_list = [trade.to_dict() for trade in trades_query]
-        if not trades_list: return None, "No trades found for today in the Firestore database."
+# --- 4. COMPLIANCE REPORT BUILDERS ---
+# The Firestore reads behind these reports live in KYC/async_db.py; the builders here are shared.
+# Fields each report needs from a trade; queries project to these instead of whole documents.
+MARGIN_TRADE_FIELDS = ['client_id', 'stock_symbol', 'trade_type', 'quantity', 'price_per_share']
+SURVEILLANCE_TRADE_FIELDS = ['client_id', 'stock_symbol', 'quantity', 'price_per_share']
+
+def todays_trade_window():
+    today = date.today()
+    return datetime.combine(today, datetime.min.time()), datetime.combine(today, datetime.max.time())
+
+def report_file_path(report_filename):
+    """
+    A /tmp path for one report, in its own directory so concurrent requests for the same
+    day's report don't overwrite or delete each other's file. The file keeps its plain name
+    for the download; remove it with remove_report_file.
+    """
+    return os.path.join(tempfile.mkdtemp(prefix="report_", dir="/tmp"), report_filename)
+
+def remove_report_file(report_path):
+    os.remove(report_path)
+    os.rmdir(os.path.dirname(report_path))
+
+def build_margin_report(trades_list):
+    """Computes margin status for today's trades and writes the CSV report, returning its path."""
+    today = date.today()
+    with stage("margin.build_dataframe"):
         trade_df = pd.DataFrame(trades_list)
-        trade_df['total_trade_value'] = trade_df['quantity'] * trade_df['price_per_share']
-        trade_df['margin_required'] = trade_df['total_trade_value'] * 0.20
-        trade_df['margin_collected'] = trade_df['margin_required'] * np.random.uniform(0.95, 1.2, size=len(trade_df))
-        trade_df['margin_collected'] = trade_df['margin_collected'].round(2)
-        trade_df['margin_status'] = np.where(trade_df['margin_collected'] >= trade_df['margin_required'], 'OK', 'SHORTFALL')
-        report_columns = ['client_id', 'stock_symbol', 'trade_type', 'quantity', 'price_per_share', 'total_trade_value', 'margin_required', 'margin_collected', 'margin_status']
-        report_df = trade_df.reindex(columns=report_columns, fill_value='N/A')
-        
-        # CRITICAL FIX: Write to the /tmp directory, which is writable on Cloud Run
-        report_filename = f"Margin_Report_{today.strftime('%d-%m-%Y')}.csv"
-        report_path = os.path.join('/tmp', report_filename)
-        
+    trade_df['total_trade_value'] = trade_df['quantity'] * trade_df['price_per_share']
+    trade_df['margin_required'] = trade_df['total_trade_value'] * 0.20
+    trade_df['margin_collected'] = trade_df['margin_required'] * np.random.uniform(0.95, 1.2, size=len(trade_df))
+    trade_df['margin_collected'] = trade_df['margin_collected'].round(2)
+    trade_df['margin_status'] = np.where(trade_df['margin_collected'] >= trade_df['margin_required'], 'OK', 'SHORTFALL')
+    report_columns = ['client_id', 'stock_symbol', 'trade_type', 'quantity', 'price_per_share', 'total_trade_value', 'margin_required', 'margin_collected', 'margin_status']
+    report_df = trade_df.reindex(columns=report_columns, fill_value='N/A')
+
+    # CRITICAL FIX: Write to the /tmp directory, which is writable on Cloud Run
+    report_path = report_file_path(f"Margin_Report_{today.strftime('%d-%m-%Y')}.csv")
+
+    with stage("margin.write_csv"):
         report_df.to_csv(report_path, index=False)
-        return report_path, None
-    except Exception as e:
-        return None, str(e)
-
-def run_surveillance_checks_from_db():
-    if not db: return None, "Firestore not connected."
-    try:
-        def get_trades_for_today():
-            today = date.today()
-            start_of_day = datetime.combine(today, datetime.min.time())
-            end_of_day = datetime.combine(today, datetime.max.time())
-            trades_query = db.collection('trades').where('trade_date', '>=', start_of_day).where('trade_date', '<=', end_of_day).stream()
-            return pd.DataFrame([trade.to_dict() for trade in trades_query])
-        df = get_trades_for_today()
-        if df.empty: return {"status": "success", "flagged_trades": []}, None
-        flagged_trades = []
+    return report_path
+
+def flag_suspicious_trades(trades_list):
+    """Applies the daily surveillance rules and returns one flag per (client, stock, reason)."""
+    with stage("surveillance.build_dataframe"):
+        df = pd.DataFrame(trades_list)
+    if df.empty: return []
+    flagged_trades = []
+    with stage("surveillance.rules"):
         df['trade_value'] = df['quantity'] * df['price_per_share']
         large_trades = df[df['trade_value'] > 500000]
         for _, row in large_trades.iterrows():
              flagged_trades.append({"client_id": row['client_id'], "stock_symbol": row['stock_symbol'], "reason": "Large Trade Value"})
         unique_flags = [dict(t) for t in {tuple(d.items()) for d in flagged_trades}]
-        return {"status": "success", "flagged_trades": unique_flags}, None
-    except Exception as e:
-        return None, str(e)
+    return unique_flags
 
 def generate_suspicious_trade_pdf(flagged_trades):
     try:
@@ -228,34 +196,18 @@ def generate_suspicious_trade_pdf(flagged_trades):
                 pdf.multi_cell(0, 10, str(trade.get("reason", "N/A")), 1)
         
         # CRITICAL FIX: Write to the /tmp directory
-        report_filename = f"Suspicious_Activity_Report_{date.today().strftime('%d-%m-%Y')}.pdf"
-        report_path = os.path.join('/tmp', report_filename)
-        pdf.output(report_path)
+        report_path = report_file_path(f"Suspicious_Activity_Report_{date.today().strftime('%d-%m-%Y')}.pdf")
+        with stage("pdf.suspicious_activity.output"):
+            pdf.output(report_path)
         return report_path, None
     except Exception as e:
         return None, str(e)
 
-def run_quarterly_settlement_check():
-    if not db: return None, "Firestore not connected."
-    try:
-        ninety_days_ago = datetime.now() - timedelta(days=90)
-        settlement_due_clients = []
-        balances_ref = db.collection('client_balances').where('balance', '>', 0).stream()
-        for bal_doc in balances_ref:
-            client_id = bal_doc.id
-            balance = bal_doc.to_dict().get('balance', 0)
-            trades_query = db.collection('trades').where('client_id', '==', client_id).order_by('trade_date', direction=firestore.Query.DESCENDING).limit(1).stream()
-            last_trade = next(trades_query, None)
-            if last_trade and last_trade.to_dict()['trade_date'] < ninety_days_ago:
-                client_doc = db.collection('clients').document(client_id).get()
-                if client_doc.exists:
-                    settlement_due_clients.append({
-                        "client_id": client_id, "full_name": client_doc.to_dict().get('full_name'),
-                        "balance": balance, "days_since_last_trade": (datetime.now() - last_trade.to_dict()['trade_date']).days
-                    })
-        return {"status": "success", "settlement_due_clients": settlement_due_clients}, None
-    except Exception as e:
-        return None, str(e)
+def build_settlement_entry(client_id, full_name, balance, last_trade_date):
+    return {
+        "client_id": client_id, "full_name": full_name,
+        "balance": balance, "days_since_last_trade": (datetime.now() - last_trade_date).days
+    }
 
 def generate_qs_report_pdf(settlement_due_clients):
     try:
@@ -280,9 +232,9 @@ def generate_qs_report_pdf(settlement_due_clients):
                 pdf.cell(0, 10, str(int(client.get("days_since_last_trade", 0))), 1); pdf.ln()
         
         # CRITICAL FIX: Write to the /tmp directory
-        report_filename = f"Quarterly_Settlement_Report_{date.today().strftime('%d-%m-%Y')}.pdf"
-        report_path = os.path.join('/tmp', report_filename)
-        pdf.output(report_path)
+        report_path = report_file_path(f"Quarterly_Settlement_Report_{date.today().strftime('%d-%m-%Y')}.pdf")
+        with stage("pdf.quarterly_settlement.output"):
+            pdf.output(report_path)
         return report_path, None
     except Exception as e:
         return None, str(e)
\ No newline at end of file
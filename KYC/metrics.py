@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# --- 1. CONFIGURATION ---
+# Latency buckets (seconds) cover everything from a regex parse to a slow DeepFace run.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Per-request trace logs are off by default. Set KYC_TRACE_LOG to a file path (or "stdout")
+# to enable them, and KYC_TRACE_SLOW_MS to only keep traces slower than the threshold.
+TRACE_LOG = os.environ.get("KYC_TRACE_LOG")
+TRACE_SLOW_MS = float(os.environ.get("KYC_TRACE_SLOW_MS", "0"))
+
+_HELP = {
+    "kyc_stage_duration_seconds": "Time spent in each KYC/compliance processing stage.",
+    "kyc_stage_errors_total": "Number of stages that raised an exception.",
+    "kyc_db_documents_total": "Number of Firestore documents read or written per stage.",
+    "kyc_http_request_duration_seconds": "End-to-end HTTP request latency.",
+    "kyc_http_requests_total": "Number of HTTP requests served.",
+}
+
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> {"buckets": [...], "sum": float, "count": int}
+_counters = {}    # (name, labels) -> float
+_current_trace = contextvars.ContextVar("kyc_current_trace", default=None)
+
+# --- 2. RECORDING ---
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def observe(name, value, **labels):
+    """Records one observation into a histogram."""
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = {"buckets": [0] * len(DEFAULT_BUCKETS), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(DEFAULT_BUCKETS):
+            if value <= bound:
+                hist["buckets"][i] += 1
+        hist["sum"] += value
+        hist["count"] += 1
+
+def inc(name, value=1, **labels):
+    """Increments a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def count_documents(stage_name, collection, n):
+    """Records how many documents a stage read from (or wrote to) a collection."""
+    inc("kyc_db_documents_total", n, stage=stage_name, collection=collection)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace["documents"].append({"stage": stage_name, "collection": collection, "count": n})
+
+@contextmanager
+def stage(stage_name):
+    """Times a block of work as a named stage, e.g. `with stage("ocr.pan"): ...`."""
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except Exception:
+        failed = True
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        observe("kyc_stage_duration_seconds", elapsed, stage=stage_name)
+        if failed:
+            inc("kyc_stage_errors_total", stage=stage_name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace["stages"].append({"stage": stage_name, "ms": round(elapsed * 1000, 3), "error": failed})
+
+# --- 3. PER-REQUEST TRACES ---
+def start_trace(method, path):
+    """Starts collecting stage timings for the current request."""
+    return _current_trace.set({"method": method, "path": path, "stages": [], "documents": []})
+
+def finish_trace(token, status_code, elapsed):
+    """Records request-level metrics and writes the trace log line if tracing is enabled."""
+    trace = _current_trace.get()
+    _current_trace.reset(token)
+    observe("kyc_http_request_duration_seconds", elapsed, method=trace["method"], path=trace["path"])
+    inc("kyc_http_requests_total", method=trace["method"], path=trace["path"], status=status_code)
+    if not TRACE_LOG or elapsed * 1000 < TRACE_SLOW_MS:
+        return
+    trace.update({"status": status_code, "ms": round(elapsed * 1000, 3), "ts": time.time()})
+    line = json.dumps(trace)
+    try:
+        if TRACE_LOG == "stdout":
+            print(line)
+        else:
+            with _lock, open(TRACE_LOG, "a") as f:
+                f.write(line + "\n")
+    except Exception as e:
+        print(f"Error writing trace log: {e}")
+
+# --- 4. PROMETHEUS EXPOSITION ---
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs: return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def render_prometheus():
+    """Renders every recorded metric in the Prometheus text exposition format."""
+    with _lock:
+        histograms = {k: {"buckets": list(v["buckets"]), "sum": v["sum"], "count": v["count"]} for k, v in _histograms.items()}
+        counters = dict(_counters)
+    lines = []
+    seen = set()
+    for (name, labels), hist in sorted(histograms.items()):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+        for bound, bucket_count in zip(DEFAULT_BUCKETS, hist["buckets"]):
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', repr(bound))])} {bucket_count}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {hist['count']}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {hist['sum']}")
+        lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+    for (name, labels), value in sorted(counters.items()):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+def reset():
+    """Clears all recorded metrics (used by benchmarks between runs)."""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
@@ -0,0 +1,117 @@
+import time
+import argparse
+from datetime import date
+import pandas as pd
+from KYC.metrics import stage
+
+# --- 1. CONFIGURATION ---
+# Rows read per chunk. Memory is bounded by the chunk plus one closing balance per
+# (date, account), so statements with millions of rows never need to fit in RAM.
+STATEMENT_CHUNK_ROWS = 250_000
+STATEMENT_COLUMNS = ['date', 'account_id', 'client_id', 'balance']
+DEFAULT_ACCOUNT = 'PRIMARY'
+# Row order within a day decides which balance is the day's closing balance: the last row
+# for statements in date order (the usual export), the first for newest-first statements.
+# Statements with neither `date` nor `account_id` always use their first row, as before.
+STATEMENT_ORDERS = {'oldest_first': 'last', 'newest_first': 'first'}
+DEFAULT_STATEMENT_ORDER = 'oldest_first'
+
+# --- 2. STATEMENT STREAMING ---
+def _closing_balances(statement_path, chunksize, statement_order=DEFAULT_STATEMENT_ORDER):
+    """
+    Streams the statement and keeps one closing balance per (date, account): the last row
+    of the day for `oldest_first` statements, the first for `newest_first` ones. Dates may
+    be in any format pandas parses (ambiguous ones as month/day) and may mix formats.
+    Returns the reduced frame plus row counters.
+    """
+    if statement_order not in STATEMENT_ORDERS:
+        raise ValueError(f"statement_order must be one of: {', '.join(STATEMENT_ORDERS)}")
+    keep = STATEMENT_ORDERS[statement_order]
+    header = pd.read_csv(statement_path, nrows=0).columns
+    if 'balance' not in header:
+        raise ValueError("Bank statement must have a 'balance' column.")
+    usecols = [c for c in STATEMENT_COLUMNS if c in header]
+    if 'date' not in header and 'account_id' not in header: keep = 'first'
+    closing = None
+    rows_processed = rows_rejected = 0
+    for chunk in pd.read_csv(statement_path, usecols=usecols, dtype={'date': str, 'account_id': str, 'client_id': str}, thousands=',', chunksize=chunksize):
+        rows_processed += len(chunk)
+        if 'date' not in chunk: chunk['date'] = date.today().isoformat()
+        if 'account_id' not in chunk: chunk['account_id'] = DEFAULT_ACCOUNT
+        if 'client_id' not in chunk: chunk['client_id'] = None
+        if not pd.api.types.is_numeric_dtype(chunk['balance']): chunk['balance'] = pd.to_numeric(chunk['balance'].str.replace(',', '', regex=False), errors='coerce')
+        # Normalise dates before deduplicating so format variants of one day collapse together.
+        # Statements repeat a handful of dates, so only the distinct strings are parsed.
+        days = chunk['date'].dropna().unique()
+        parsed = pd.Series(pd.to_datetime(pd.Series(days, dtype=object), format='mixed', errors='coerce').dt.strftime('%Y-%m-%d').to_numpy(), index=days)
+        chunk['date'] = chunk['date'].map(parsed)
+        valid = chunk['balance'].notna() & chunk['date'].notna() & chunk['account_id'].notna()
+        rows_rejected += int((~valid).sum())
+        reduced = chunk[valid].drop_duplicates(['date', 'account_id'], keep=keep)
+        # The accumulator goes first so file order is preserved and `keep` picks the same row as on the whole file.
+        closing = reduced if closing is None else pd.concat([closing, reduced], ignore_index=True).drop_duplicates(['date', 'account_id'], keep=keep)
+    if closing is None or closing.empty:
+        raise ValueError("Bank statement has no valid balance rows.")
+    return closing, rows_processed, rows_rejected
+
+# --- 3. RECONCILIATION ---
+def reconcile_statement(statement_path, ledger_df, chunksize=STATEMENT_CHUNK_ROWS, statement_order=DEFAULT_STATEMENT_ORDER):
+    """
+    Reconciles a bank statement against client ledger balances in one pass over the file.
+
+    `ledger_df` has `client_id` and `balance` columns (from `client_balances`). The statement
+    needs a `balance` column and may add `date`, `account_id` and `client_id`. The ledger only
+    holds today's balances, so the surplus/shortfall and per-client exceptions are for the
+    statement's latest day (`as_of`) only; `daily` is the bank-side closing total per day.
+    """
+    start = time.perf_counter()
+    with stage("funds.stream_statement"):
+        closing, rows_processed, rows_rejected = _closing_balances(statement_path, chunksize, statement_order)
+
+    with stage("funds.reconcile"):
+        ledger = ledger_df[['client_id', 'balance']].rename(columns={'balance': 'ledger_balance'})
+        ledger = ledger[ledger['ledger_balance'] > 0]
+        required_funds = float(ledger['ledger_balance'].sum())
+
+        daily = closing.groupby('date', as_index=False)['balance'].sum().rename(columns={'balance': 'bank_balance'}).sort_values('date')
+        daily['bank_balance'] = daily['bank_balance'].round(2)
+        as_of, bank_balance = daily['date'].iloc[-1], float(daily['bank_balance'].iloc[-1])
+        difference = round(bank_balance - required_funds, 2)
+        latest = closing[closing['date'] == as_of]
+        exceptions = pd.DataFrame(columns=['client_id', 'ledger_balance', 'bank_balance', 'shortfall', 'reason'])
+        attributed = latest.dropna(subset=['client_id'])
+        if not attributed.empty:
+            per_client = attributed.groupby('client_id', as_index=False)['balance'].sum().rename(columns={'balance': 'bank_balance'})
+            merged = ledger.merge(per_client, on='client_id', how='outer', indicator=True)
+            merged[['ledger_balance', 'bank_balance']] = merged[['ledger_balance', 'bank_balance']].fillna(0.0)
+            merged['shortfall'] = (merged['ledger_balance'] - merged['bank_balance']).round(2)
+            merged['reason'] = None
+            merged.loc[merged['_merge'] == 'left_only', 'reason'] = 'No bank account for client'
+            merged.loc[merged['_merge'] == 'right_only', 'reason'] = 'Bank account for unknown client'
+            merged.loc[(merged['_merge'] == 'both') & (merged['shortfall'] > 0), 'reason'] = 'Segregated balance below ledger'
+            exceptions = merged[merged['reason'].notna()].drop(columns='_merge').sort_values('shortfall', ascending=False)
+
+    elapsed = time.perf_counter() - start
+    result = {"status": 'PASS' if difference >= 0 else 'FAIL', "as_of": as_of}
+    if difference >= 0: result["surplus"] = f"{difference:,.2f}"
+    else: result["shortfall"] = f"{-difference:,.2f}"
+    result.update({
+        "bank_balance": bank_balance, "required_funds": round(required_funds, 2),
+        "daily": daily.to_dict('records'),
+        "client_exceptions": exceptions.to_dict('records'),
+        "rows_processed": rows_processed, "rows_rejected": rows_rejected,
+        "elapsed_seconds": round(elapsed, 4), "rows_per_sec": round(rows_processed / elapsed, 1) if elapsed else None,
+    })
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcile a bank statement CSV against a client ledger CSV (client_id,balance).")
+    parser.add_argument("statement")
+    parser.add_argument("ledger")
+    parser.add_argument("--chunksize", type=int, default=STATEMENT_CHUNK_ROWS)
+    parser.add_argument("--order", choices=list(STATEMENT_ORDERS), default=DEFAULT_STATEMENT_ORDER, help="Row order within a day, which decides the closing balance.")
+    args = parser.parse_args()
+    outcome = reconcile_statement(args.statement, pd.read_csv(args.ledger, dtype={'client_id': str}), args.chunksize, args.order)
+    print(f"Status as of {outcome['as_of']}: {outcome['status']} ({outcome.get('surplus') or outcome.get('shortfall')})")
+    print(f"Processed {outcome['rows_processed']:,} rows ({outcome['rows_rejected']:,} rejected) at {outcome['rows_per_sec']:,.0f} rows/sec")
+    print(f"{len(outcome['daily'])} day(s) of bank balances, {len(outcome['client_exceptions'])} client exception(s) as of {outcome['as_of']}")
@@ -0,0 +1,201 @@
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+import numpy as np
+import pandas as pd
+from firebase_admin import firestore
+from KYC.metrics import stage, count_documents
+from KYC.historical_surveillance import TRADE_FIELDS, PENNY_STOCK_PRICE, evaluate_trades, merge_partitions
+from KYC.trade_ingest import BatchWriter
+
+# --- 1. CONFIGURATION ---
+LOOKBACK_DAYS = 180            # Trade history used for features, same horizon as data_generator.py
+IN_QUERY_LIMIT = 30            # Firestore caps 'in' filters at 30 values
+QUERY_WORKERS = 8
+JOB_STATE_DOC = ('job_state', 'risk_scoring')
+CLIENT_FIELDS = ['pan_number', 'address', 'kyc_expiry_date', 'risk_category', 'risk_score']
+
+# Points per feature band; a client's score is the sum across features.
+NOTIONAL_BANDS = [(50_000_000, 2), (10_000_000, 1)]     # Total traded value in the lookback (Rs)
+FREQUENCY_BANDS = [(20, 2), (5, 1)]                     # Trades per active day
+PENNY_SHARE_BANDS = [(0.25, 2), (0.05, 1)]              # Share of notional in stocks under Rs 10
+FLAG_BANDS = [(3, 3), (1, 2)]                           # Pattern surveillance flags in the lookback
+SIZE_ONLY_FLAGS = ["Large Trade Value"]                 # Already reflected in total_notional, so not counted as flags
+HIGH_RISK_SCORE = 5
+MEDIUM_RISK_SCORE = 2
+
+def _firestore_client():
+    import firebase_admin
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app()
+    return firestore.client()
+
+# --- 2. FEATURES & SCORING (vectorized over all clients at once) ---
+def _band_points(values, bands):
+    return np.select([values >= threshold for threshold, _ in bands], [points for _, points in bands], default=0)
+
+def compute_features(trades_df, clients_df, today=None):
+    """
+    Builds one row of features per client from their trades (TRADE_FIELDS) and KYC
+    profile (`client_id` plus CLIENT_FIELDS). Clients without trades get zero activity.
+    """
+    today = today or date.today()
+    features = clients_df[['client_id']].drop_duplicates().set_index('client_id')
+    if not trades_df.empty:
+        trades = trades_df.assign(
+            notional=trades_df['quantity'] * trades_df['price_per_share'],
+            trade_day=pd.to_datetime(trades_df['trade_date']).dt.strftime('%Y-%m-%d'))
+        trades['penny_notional'] = trades['notional'].where(trades['price_per_share'] < PENNY_STOCK_PRICE, 0.0)
+        activity = trades.groupby('client_id').agg(
+            total_notional=('notional', 'sum'), trade_count=('notional', 'size'),
+            active_days=('trade_day', 'nunique'), penny_notional=('penny_notional', 'sum'))
+        features = features.join(activity)
+        flags = pd.DataFrame(merge_partitions([evaluate_trades(trades_df[TRADE_FIELDS])]), columns=['client_id', 'reason', 'occurrences'])
+        flags = flags[~flags['reason'].isin(SIZE_ONLY_FLAGS)]
+        features = features.join(flags.groupby('client_id')['occurrences'].sum().rename('surveillance_flags'))
+    for column in ('total_notional', 'trade_count', 'active_days', 'penny_notional', 'surveillance_flags'):
+        if column not in features: features[column] = 0
+    features = features.fillna(0)
+    features['trades_per_active_day'] = (features['trade_count'] / features['active_days'].replace(0, np.nan)).fillna(0)
+    features['penny_share'] = (features['penny_notional'] / features['total_notional'].replace(0, np.nan)).fillna(0)
+
+    profile = clients_df.set_index('client_id').reindex(features.index)
+    expiry = pd.to_datetime(profile['kyc_expiry_date'], errors='coerce')
+    features['kyc_expired'] = (expiry < pd.Timestamp(today)).fillna(False).astype(bool)
+    features['kyc_expiring'] = (~features['kyc_expired'] & (expiry <= pd.Timestamp(today + timedelta(days=30)))).fillna(False).astype(bool)
+    missing = lambda column: profile[column].isna() | profile[column].isin(['', 'N/A'])
+    features['kyc_incomplete'] = (missing('pan_number') | missing('address')).astype(bool)
+    return features.drop(columns='penny_notional')
+
+def score_features(features):
+    """Adds `risk_score` and `risk_category` (Low/Medium/High) to a features frame."""
+    score = (
+        _band_points(features['total_notional'], NOTIONAL_BANDS)
+        + _band_points(features['trades_per_active_day'], FREQUENCY_BANDS)
+        + _band_points(features['penny_share'], PENNY_SHARE_BANDS)
+        + _band_points(features['surveillance_flags'], FLAG_BANDS)
+        + np.where(features['kyc_expired'], 2, np.where(features['kyc_expiring'], 1, 0))
+        + features['kyc_incomplete'].astype(int)
+    )
+    scored = features.assign(risk_score=score.astype(int))
+    scored['risk_category'] = np.select([scored['risk_score'] >= HIGH_RISK_SCORE, scored['risk_score'] >= MEDIUM_RISK_SCORE], ['High', 'Medium'], default='Low')
+    return scored
+
+def _risk_fields(row):
+    """The fields written back to a client document for one scored row."""
+    return {
+        'risk_category': row['risk_category'], 'risk_score': int(row['risk_score']),
+        'risk_features': {
+            'total_notional': round(float(row['total_notional']), 2), 'trade_count': int(row['trade_count']),
+            'trades_per_active_day': round(float(row['trades_per_active_day']), 2),
+            'penny_share': round(float(row['penny_share']), 4), 'surveillance_flags': int(row['surveillance_flags'])
+        },
+        'risk_scored_at': firestore.SERVER_TIMESTAMP
+    }
+
+def score_new_client(client_data):
+    """Risk fields for a client being onboarded: KYC features only, as there are no trades yet."""
+    clients = pd.DataFrame([client_data], columns=['client_id'] + CLIENT_FIELDS)
+    scored = score_features(compute_features(pd.DataFrame(columns=TRADE_FIELDS), clients))
+    return _risk_fields(scored.iloc[0])
+
+# --- 3. DATA ACCESS ---
+def _changed_client_ids(db, since, today=None):
+    """
+    Clients whose trades were ingested after `since` (from trade_ingest's client_trade_stats),
+    plus clients whose KYC has since become expired or entered the 30-day expiring window,
+    since those features change with the date rather than with new data.
+    """
+    today, last_run = today or date.today(), since.astimezone().date()
+    ids = {doc.id for doc in db.collection('client_trade_stats').where('last_ingested_at', '>', since).select([]).stream()}
+    clients = db.collection('clients')
+    # Same thresholds as compute_features: expired is expiry < today, expiring is expiry <= today + 30.
+    expired = clients.where('kyc_expiry_date', '>=', last_run.isoformat()).where('kyc_expiry_date', '<', today.isoformat())
+    expiring = clients.where('kyc_expiry_date', '>', (last_run + timedelta(days=30)).isoformat()).where('kyc_expiry_date', '<=', (today + timedelta(days=30)).isoformat())
+    for query in (expired, expiring):
+        ids.update(doc.id for doc in query.select([]).stream())
+    return sorted(ids)
+
+def _load_trades(db, client_ids, lookback_start):
+    base = db.collection('trades').where('trade_date', '>=', lookback_start)
+    if client_ids is None:
+        return [doc.to_dict() for doc in base.select(TRADE_FIELDS).stream()]
+    chunks = [client_ids[i:i + IN_QUERY_LIMIT] for i in range(0, len(client_ids), IN_QUERY_LIMIT)]
+    fetch = lambda chunk: [doc.to_dict() for doc in base.where('client_id', 'in', chunk).select(TRADE_FIELDS).stream()]
+    with ThreadPoolExecutor(max_workers=QUERY_WORKERS) as pool:
+        return [trade for result in pool.map(fetch, chunks) for trade in result]
+
+def _load_clients(db, client_ids):
+    if client_ids is None:
+        docs = db.collection('clients').select(CLIENT_FIELDS).stream()
+    else:
+        docs = db.get_all([db.collection('clients').document(client_id) for client_id in client_ids], field_paths=CLIENT_FIELDS)
+    return [dict(doc.to_dict(), client_id=doc.id) for doc in docs if doc.exists]
+
+# --- 4. PUBLIC ENTRY POINT ---
+def run_risk_scoring(db, full=False, dry_run=False, lookback_days=LOOKBACK_DAYS):
+    """
+    Recomputes risk_category for clients with trades ingested or KYC expiry crossed since the
+    last run (or all clients when `full`, or when the job has never run) and writes changed
+    values back in batches. New clients are scored at onboarding (score_new_client); trades
+    loaded outside trade_ingest (e.g. data_generator.py) need a full run.
+    Returns (summary, error) like the other compliance functions.
+    """
+    if not db: return None, "Firestore not connected."
+    try:
+        started_at = datetime.now(timezone.utc)
+        start = time.perf_counter()
+        state_ref = db.collection(JOB_STATE_DOC[0]).document(JOB_STATE_DOC[1])
+        last_run_at = None if full else (state_ref.get().to_dict() or {}).get('last_run_at')
+        mode = "full" if last_run_at is None else "incremental"
+
+        with stage("risk.select_clients"):
+            client_ids = None if mode == "full" else _changed_client_ids(db, last_run_at)
+        if client_ids == []:
+            if not dry_run: state_ref.set({'last_run_at': started_at, 'clients_scored': 0, 'mode': mode})
+            return {"status": "success", "mode": mode, "clients_scored": 0, "clients_changed": 0, "elapsed_seconds": round(time.perf_counter() - start, 3)}, None
+
+        lookback_start = datetime.combine(date.today() - timedelta(days=lookback_days), datetime.min.time())
+        with stage("risk.load_trades"):
+            trades = pd.DataFrame(_load_trades(db, client_ids, lookback_start), columns=TRADE_FIELDS)
+        count_documents("risk.load_trades", "trades", len(trades))
+        with stage("risk.load_clients"):
+            clients = pd.DataFrame(_load_clients(db, client_ids), columns=['client_id'] + CLIENT_FIELDS)
+        count_documents("risk.load_clients", "clients", len(clients))
+
+        with stage("risk.score"):
+            scored = score_features(compute_features(trades, clients))
+            current = clients.set_index('client_id')[['risk_category', 'risk_score']].reindex(scored.index)
+            changed = scored[(scored['risk_category'] != current['risk_category']) | (scored['risk_score'] != current['risk_score'])]
+
+        if not dry_run:
+            with stage("risk.write_back"):
+                writer = BatchWriter(db)
+                for client_id, row in changed.iterrows():
+                    writer.add(db.collection('clients').document(client_id), _risk_fields(row), "merge")
+                writer.close()
+            if writer.errors: return None, f"{len(writer.errors)} batch commit(s) failed: {writer.errors[0]}"
+            count_documents("risk.write_back", "clients", len(changed))
+            state_ref.set({'last_run_at': started_at, 'clients_scored': len(scored), 'mode': mode})
+
+        return {
+            "status": "success", "mode": mode, "clients_scored": len(scored), "clients_changed": len(changed),
+            "trades_used": len(trades), "categories": scored['risk_category'].value_counts().to_dict(),
+            "elapsed_seconds": round(time.perf_counter() - start, 3)
+        }, None
+    except Exception as e:
+        return None, str(e)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute client risk categories from trades and KYC data.")
+    parser.add_argument("--full", action="store_true", help="Rescore every client instead of only those with new trades.")
+    parser.add_argument("--dry-run", action="store_true", help="Compute scores without writing them back.")
+    parser.add_argument("--lookback-days", type=int, default=LOOKBACK_DAYS)
+    args = parser.parse_args()
+    summary, error = run_risk_scoring(_firestore_client(), args.full, args.dry_run, args.lookback_days)
+    if error:
+        print(f"❌ Risk scoring failed: {error}")
+    else:
+        print(f"✅ {summary['mode'].title()} run scored {summary['clients_scored']} client(s), {'found' if args.dry_run else 'updated'} {summary['clients_changed']} change(s) in {summary['elapsed_seconds']}s")
+        if summary.get("categories"): print(f"  Categories: {summary['categories']}")
@@ -0,0 +1,279 @@
+import os
+import time
+import argparse
+import threading
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+import pandas as pd
+from firebase_admin import firestore
+from KYC.metrics import stage, count_documents
+
+# --- 1. CONFIGURATION ---
+BATCH_OPS = 400          # Ops per Firestore batch, same cap as data_generator.py
+MAX_BATCH_OPS = 500      # Firestore's hard limit per batch
+GROUP_MARGIN_OPS = 4     # Aggregate ops a batch group may add beyond its counted size (see assign_batches)
+COMMIT_WORKERS = 8       # Batches committed in parallel
+MAX_IN_FLIGHT = 16       # Reading pauses once this many batches are waiting to commit
+CHUNK_ROWS = 20_000      # Rows read and validated per chunk
+MAX_REJECT_SAMPLES = 20
+REQUIRED_COLUMNS = ['client_id', 'stock_symbol', 'trade_type', 'quantity', 'price_per_share']
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl', '.json')
+
+def _firestore_client():
+    import firebase_admin
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app()
+    return firestore.client()
+
+# --- 2. READING & VALIDATION ---
+def iter_trade_chunks(path, chunksize=CHUNK_ROWS):
+    """Streams a CSV or NDJSON trade file in chunks of raw rows."""
+    if path.lower().endswith(NDJSON_EXTENSIONS):
+        return pd.read_json(path, lines=True, chunksize=chunksize, dtype=False)
+    return pd.read_csv(path, chunksize=chunksize, dtype=str)
+
+def validate_trades(chunk, default_trade_date, seen_trade_ids=()):
+    """
+    Checks a chunk column-wise and returns (valid_df, rejected_df). Rows without a
+    trade_date (the CSV generators don't write one) are booked on `default_trade_date`.
+    `seen_trade_ids` holds ids from earlier chunks of the same file.
+    """
+    missing = [c for c in REQUIRED_COLUMNS if c not in chunk]
+    if missing: raise ValueError(f"Trade file is missing required column(s): {', '.join(missing)}")
+    df = pd.DataFrame(index=chunk.index)
+    df['client_id'] = chunk['client_id'].astype('string').str.strip()
+    df['stock_symbol'] = chunk['stock_symbol'].astype('string').str.strip().str.upper()
+    df['trade_type'] = chunk['trade_type'].astype('string').str.strip().str.upper()
+    df['quantity'] = pd.to_numeric(chunk['quantity'], errors='coerce')
+    df['price_per_share'] = pd.to_numeric(chunk['price_per_share'], errors='coerce')
+    if 'trade_date' in chunk:
+        df['trade_date'] = pd.to_datetime(chunk['trade_date'], errors='coerce', utc=True).dt.tz_localize(None)
+    else:
+        df['trade_date'] = pd.Timestamp(default_trade_date)
+    if 'trade_id' in chunk: df['trade_id'] = chunk['trade_id'].astype('string').str.strip().replace('', pd.NA)
+
+    checks = [
+        (~df['client_id'].str.fullmatch(r'CL\d+').fillna(False).astype(bool), "invalid client_id"),
+        (df['stock_symbol'].fillna('').eq(''), "missing stock_symbol"),
+        (~df['trade_type'].isin(['BUY', 'SELL']).fillna(False).astype(bool), "trade_type must be BUY or SELL"),
+        (~df['quantity'].between(0, float('inf'), inclusive='neither') | (df['quantity'] % 1 != 0), "quantity must be a positive integer"),
+        (~df['price_per_share'].between(0, float('inf'), inclusive='neither'), "price_per_share must be positive"),
+        (df['trade_date'].isna(), "invalid trade_date"),
+    ]
+    if 'trade_id' in df:
+        # trade_id becomes the document id, so it must be a valid one and unique in the file.
+        checks.append((df['trade_id'].str.contains('/', regex=False).fillna(False).astype(bool) | df['trade_id'].isin(['.', '..']).fillna(False).astype(bool), "invalid trade_id"))
+        checks.append((df['trade_id'].notna() & (df['trade_id'].duplicated(keep='first') | df['trade_id'].isin(seen_trade_ids).fillna(False).astype(bool)), "duplicate trade_id"))
+    reasons = pd.Series(pd.NA, index=df.index, dtype='string')
+    for mask, reason in checks:
+        reasons = reasons.mask(mask & reasons.isna(), reason)
+    rejected = chunk.loc[reasons.notna()].assign(reject_reason=reasons[reasons.notna()])
+    valid = df.loc[reasons.isna()].copy()
+    valid['quantity'] = valid['quantity'].astype('int64')
+    valid['price_per_share'] = valid['price_per_share'].astype('float64')
+    return valid, rejected
+
+# --- 3. WRITE OPERATIONS ---
+def assign_batches(valid, batch_ops=BATCH_OPS):
+    """
+    Numbers rows into batch groups so that one group's trades plus its per-client and
+    per-client-per-day aggregates fit in a single batch. Rows are sorted by client and day
+    first so a group touches as few aggregate documents as possible.
+    """
+    frame = valid.assign(trade_day=valid['trade_date'].dt.strftime('%Y-%m-%d')).sort_values(['client_id', 'trade_day'], kind='stable')
+    new_client = frame['client_id'].ne(frame['client_id'].shift()).fillna(True).to_numpy(dtype=bool)
+    new_day = new_client | frame['trade_day'].ne(frame['trade_day'].shift()).fillna(True).to_numpy(dtype=bool)
+    ops = 1 + new_client.astype(int) + new_day.astype(int)
+    # A group's first row always opens a client and a day aggregate (up to 2 more ops than
+    # counted here) and its last row may overrun the bucket by 2, hence the 4-op margin.
+    return frame.assign(batch_group=(ops.cumsum() - ops) // (batch_ops - GROUP_MARGIN_OPS))
+
+def drop_ingested_trades(db, valid):
+    """
+    Removes rows whose trade_id already exists in `trades` and returns (new_rows, duplicates).
+    Runs before batching, so the aggregates are only built from trades that are actually new.
+    """
+    if 'trade_id' not in valid: return valid, 0
+    trade_ids = valid['trade_id'].dropna().unique().tolist()
+    if not trade_ids: return valid, 0
+    trades = db.collection('trades')
+    existing = {doc.id for doc in db.get_all([trades.document(trade_id) for trade_id in trade_ids], field_paths=[]) if doc.exists}
+    ingested = valid['trade_id'].isin(existing).fillna(False).astype(bool)
+    return valid.loc[~ingested], int(ingested.sum())
+
+def trade_operations(db, valid):
+    """One `trades` document per valid row, keyed by trade_id when the file has one."""
+    trades = db.collection('trades')
+    records = valid.drop(columns=['trade_day', 'batch_group']).astype({'client_id': object, 'stock_symbol': object, 'trade_type': object}).to_dict('records')
+    for group, record in zip(valid['batch_group'].to_numpy(), records):
+        record['trade_date'] = record['trade_date'].to_pydatetime()
+        trade_id = record.get('trade_id')
+        if trade_id is None or pd.isna(trade_id):
+            record.pop('trade_id', None)
+            yield group, trades.document(), record, "create"
+        else:
+            yield group, trades.document(trade_id), record, "create"
+
+def aggregate_operations(db, valid):
+    """
+    Per-client and per-client-per-day aggregates for each batch group, written as merge-sets
+    with Increment/Maximum transforms so groups (and concurrent ingests) add up without reads.
+    """
+    frame = valid.assign(notional=valid['quantity'] * valid['price_per_share'])
+    per_client = frame.groupby(['batch_group', 'client_id']).agg(last_trade=('trade_date', 'max'), notional=('notional', 'sum'), trades=('notional', 'size'))
+    for (group, client_id), row in per_client.iterrows():
+        yield group, db.collection('client_trade_stats').document(client_id), {
+            'client_id': client_id, 'last_trade_epoch': firestore.Maximum(row['last_trade'].timestamp()),
+            'total_notional': firestore.Increment(round(float(row['notional']), 2)), 'trade_count': firestore.Increment(int(row['trades'])),
+            'last_ingested_at': firestore.SERVER_TIMESTAMP
+        }, "merge"
+    per_day = frame.groupby(['batch_group', 'client_id', 'trade_day']).agg(notional=('notional', 'sum'), trades=('notional', 'size'))
+    for (group, client_id, trade_day), row in per_day.iterrows():
+        yield group, db.collection('client_daily_notional').document(f"{client_id}_{trade_day}"), {
+            'client_id': client_id, 'trade_day': trade_day,
+            'notional': firestore.Increment(round(float(row['notional']), 2)), 'trade_count': firestore.Increment(int(row['trades']))
+        }, "merge"
+
+class BatchWriter:
+    """Groups writes into size-capped batches and commits them on a thread pool with bounded in-flight batches."""
+    def __init__(self, db, batch_ops=BATCH_OPS, workers=COMMIT_WORKERS, max_in_flight=MAX_IN_FLIGHT):
+        self._db = db
+        self._batch_ops = batch_ops
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._batch = db.batch()
+        self._pending = 0
+        self.batches_committed = 0
+        self.ops_committed = 0
+        self.rows_committed = 0
+        self.errors = []
+
+    def add(self, reference, data, mode="set"):
+        """Queues a write; `mode` is "set", "merge" or "create"."""
+        if self._pending >= self._batch_ops: self.flush()
+        if mode == "create": self._batch.create(reference, data)
+        else: self._batch.set(reference, data, merge=(mode == "merge"))
+        self._pending += 1
+
+    def flush(self, rows=0):
+        """Submits the current batch; `rows` is how many input rows it stands for."""
+        if not self._pending: return
+        batch, ops = self._batch, self._pending
+        self._batch, self._pending = self._db.batch(), 0
+        self._slots.acquire()  # Backpressure: blocks the reader while too many commits are queued
+        future = self._pool.submit(self._commit, batch, ops, rows)
+        future.add_done_callback(lambda _: self._slots.release())
+
+    def _commit(self, batch, ops, rows):
+        try:
+            with stage("ingest.batch_commit"):
+                batch.commit()
+            with self._lock:
+                self.batches_committed += 1
+                self.ops_committed += ops
+                self.rows_committed += rows
+        except Exception as e:
+            # Trades already in Firestore are dropped before batching, so an AlreadyExists here
+            # means a concurrent ingest of the same trade_id; the whole batch is rejected and
+            # reported as an error rather than as duplicates, since its other rows were new.
+            with self._lock:
+                self.errors.append(str(e))
+
+    def close(self):
+        self.flush()
+        self._pool.shutdown(wait=True)
+
+    def abort(self):
+        """Drops the batch still being filled and waits for the ones already submitted."""
+        self._batch, self._pending = self._db.batch(), 0
+        self._pool.shutdown(wait=True)
+
+# --- 4. PUBLIC ENTRY POINT ---
+def ingest_trade_file(path, db, default_trade_date=None, chunksize=CHUNK_ROWS, batch_ops=BATCH_OPS, workers=COMMIT_WORKERS, max_in_flight=MAX_IN_FLIGHT, dry_run=False):
+    """
+    Streams a trade file into `trades` and updates `client_trade_stats` / `client_daily_notional`
+    in the same pass. Each batch commits a group of trades together with their aggregates, so a
+    failure part-way leaves trades and aggregates consistent. When the file has trade_id, trades
+    are created under that id and rows already in `trades` are skipped as duplicates (with their
+    aggregate increments), so a corrected or appended file can be re-ingested without double counting.
+
+    Returns (summary, error) like the other compliance functions. If reading fails part-way,
+    the unfinished batch is dropped and both are returned, the summary saying what was committed.
+    """
+    if not db and not dry_run: return None, "Firestore not connected."
+    if not os.path.exists(path): return None, f"Trade file not found: {path}"
+    if not GROUP_MARGIN_OPS < batch_ops <= MAX_BATCH_OPS: return None, f"batch_ops must be between {GROUP_MARGIN_OPS + 1} and {MAX_BATCH_OPS}."
+    default_trade_date = default_trade_date or datetime.combine(date.today(), datetime.min.time())
+    start = time.perf_counter()
+    rows_read = rows_valid = 0
+    rejected_count, reject_samples = 0, []
+    rows_duplicate, seen_trade_ids = 0, set()
+    error = None
+    writer = None if dry_run else BatchWriter(db, batch_ops, workers, max_in_flight)
+    try:
+        for chunk in iter_trade_chunks(path, chunksize):
+            rows_read += len(chunk)
+            with stage("ingest.validate"):
+                valid, rejected = validate_trades(chunk, default_trade_date, seen_trade_ids)
+            if 'trade_id' in valid: seen_trade_ids.update(valid['trade_id'].dropna())
+            rows_valid += len(valid)
+            rejected_count += len(rejected)
+            if len(reject_samples) < MAX_REJECT_SAMPLES:
+                reject_samples.extend(rejected.head(MAX_REJECT_SAMPLES - len(reject_samples)).astype(str).to_dict('records'))
+            if writer and not valid.empty:
+                with stage("ingest.dedupe"):
+                    valid, duplicates = drop_ingested_trades(db, valid)
+                rows_duplicate += duplicates
+            if writer and not valid.empty:
+                with stage("ingest.queue_writes"):
+                    valid = assign_batches(valid, batch_ops)
+                    groups = {}
+                    for group, reference, data, mode in chain(trade_operations(db, valid), aggregate_operations(db, valid)):
+                        groups.setdefault(group, []).append((reference, data, mode))
+                    for operations in groups.values():
+                        for reference, data, mode in operations: writer.add(reference, data, mode)
+                        writer.flush(rows=sum(1 for _, _, mode in operations if mode == "create"))
+    except Exception as e:
+        error = str(e).strip()
+    if writer:
+        if error: writer.abort()
+        else: writer.close()
+
+    elapsed = time.perf_counter() - start
+    rows_written = writer.rows_committed if writer else 0
+    if writer: count_documents("ingest.batch_commit", "trades", rows_written)
+    summary = {
+        "status": "failed" if error else "partial" if writer and writer.errors else "success",
+        "rows_read": rows_read, "rows_valid": rows_valid, "rows_written": rows_written, "rows_rejected": rejected_count,
+        "rows_duplicate": rows_duplicate,
+        "batches_committed": writer.batches_committed if writer else 0,
+        "ops_committed": writer.ops_committed if writer else 0,
+        "commit_errors": writer.errors[:MAX_REJECT_SAMPLES] if writer else [],
+        "elapsed_seconds": round(elapsed, 3), "rows_per_sec": round(rows_read / elapsed, 1) if elapsed else None,
+        "rejected_samples": reject_samples
+    }
+    return summary, error
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a CSV/NDJSON trade file into Firestore.")
+    parser.add_argument("path")
+    parser.add_argument("--trade-date", help="Date (YYYY-MM-DD) for rows without trade_date; defaults to today.")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--batch-ops", type=int, default=BATCH_OPS)
+    parser.add_argument("--workers", type=int, default=COMMIT_WORKERS)
+    parser.add_argument("--max-in-flight", type=int, default=MAX_IN_FLIGHT)
+    parser.add_argument("--dry-run", action="store_true", help="Validate only; nothing is written.")
+    args = parser.parse_args()
+    default_date = datetime.combine(date.fromisoformat(args.trade_date), datetime.min.time()) if args.trade_date else None
+    summary, error = ingest_trade_file(args.path, None if args.dry_run else _firestore_client(), default_date, args.chunksize, args.batch_ops, args.workers, args.max_in_flight, args.dry_run)
+    if error:
+        print(f"❌ Ingestion failed: {error}")
+        if summary: print(f"  {summary['rows_written']:,} row(s) were committed before the failure.")
+    else:
+        print(f"✅ {summary['rows_written']:,} of {summary['rows_read']:,} rows ingested ({summary['rows_rejected']:,} rejected, {summary['rows_duplicate']:,} already ingested) in {summary['elapsed_seconds']}s — {summary['rows_per_sec']:,.0f} rows/sec")
+        for sample in summary["rejected_samples"][:5]:
+            print(f"  Rejected: {sample}")
+        if summary["commit_errors"]:
+            print(f"❌ {len(summary['commit_errors'])} batch commit(s) failed: {summary['commit_errors'][0]}")
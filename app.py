@@ -1,27 +1,41 @@
 import os
+import time
+import uuid
 import shutil
+import asyncio
+from datetime import date, timedelta
 from typing import List, Dict, Any, Optional
 
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, BackgroundTasks, Request
+from fastapi.responses import FileResponse, PlainTextResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
 
 # Assuming 'KYC' is a folder in the same directory as this app.py
+from KYC import kycchecker
 from KYC.kycchecker import (
     setup_database,
-    log_kyc_to_database,
     process_local_kyc,
-    check_client_funds_from_db,
-    generate_margin_report_from_db,
-    run_surveillance_checks_from_db,
     generate_suspicious_trade_pdf,
-    run_quarterly_settlement_check,
     generate_qs_report_pdf,
-    send_kyc_notification,
-    get_expiring_kyc_from_db
+    remove_report_file
 )
+from KYC.async_db import (
+    get_async_db,
+    log_kyc_to_database_async,
+    check_client_funds_async,
+    generate_margin_report_async,
+    run_surveillance_checks_async,
+    run_quarterly_settlement_check_async,
+    send_kyc_notification_async,
+    get_expiring_kyc_async
+)
+from KYC.historical_surveillance import run_historical_surveillance, shutdown_worker_pools, MAX_LOOKBACK_DAYS
+from KYC.trade_ingest import ingest_trade_file
+from KYC.risk_scoring import run_risk_scoring
+from KYC import metrics
 
 app = FastAPI(
     title="KYC & Compliance API",
@@ -37,9 +51,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Times every request and attaches the per-stage trace collected by KYC.metrics."""
+    # Unknown paths share one label so scanners can't blow up metric cardinality.
+    route_path = request.url.path if any(getattr(route, "path", None) == request.url.path for route in app.routes) else "unmatched"
+    token = metrics.start_trace(request.method, route_path)
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        metrics.finish_trace(token, status_code, time.perf_counter() - start)
+
 class NotifyClientRequest(BaseModel):
     client_id: str
 
+# Extra run_historical_surveillance arguments. Workers open the production Firestore client by
+# default; run_load_test.py --serve points them at a seeded in-memory store instead.
+HISTORICAL_SCAN_OPTIONS: Dict[str, Any] = {}
+
 def remove_file(path: str) -> None:
     """Utility function to remove a file from /tmp, used in background tasks."""
     try:
@@ -49,13 +82,28 @@ def remove_file(path: str) -> None:
     except Exception as e:
         print(f"Error removing file {path}: {e}")
 
+def report_response(report_path: str) -> FileResponse:
+    """Streams a generated report and deletes it (and its per-request directory) once sent."""
+    def cleanup():
+        try:
+            remove_report_file(report_path)
+        except Exception as e:
+            print(f"Error removing report {report_path}: {e}")
+    return FileResponse(path=report_path, filename=os.path.basename(report_path), background=BackgroundTask(cleanup))
+
 @app.on_event("startup")
 async def startup_event():
     """Initializes the database connection when the API starts."""
     print("Setting up database connection...")
     setup_database()
+    get_async_db()
     print("Database connection established.")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stops the historical surveillance worker processes."""
+    shutdown_worker_pools()
+
 @app.post('/api/kyc/onboard', tags=["KYC"])
 async def onboard_client(
     background_tasks: BackgroundTasks,
@@ -75,16 +123,17 @@ async def onboard_client(
     temp_files = [selfie_path, pan_path, aadhaar_front_path, aadhaar_back_path]
     
     try:
-        with open(selfie_path, "wb") as buffer: shutil.copyfileobj(selfie.file, buffer)
-        with open(pan_path, "wb") as buffer: shutil.copyfileobj(pan.file, buffer)
-        with open(aadhaar_front_path, "wb") as buffer: shutil.copyfileobj(aadhaar_front.file, buffer)
-        with open(aadhaar_back_path, "wb") as buffer: shutil.copyfileobj(aadhaar_back.file, buffer)
+        with metrics.stage("upload.copy_files"):
+            with open(selfie_path, "wb") as buffer: shutil.copyfileobj(selfie.file, buffer)
+            with open(pan_path, "wb") as buffer: shutil.copyfileobj(pan.file, buffer)
+            with open(aadhaar_front_path, "wb") as buffer: shutil.copyfileobj(aadhaar_front.file, buffer)
+            with open(aadhaar_back_path, "wb") as buffer: shutil.copyfileobj(aadhaar_back.file, buffer)
 
         result = process_local_kyc(selfie_path, pan_path, aadhaar_front_path, aadhaar_back_path, name)
 
         if result.get("status") == "success":
             kyc_data = result["data"]
-            log_kyc_to_database(kyc_data)
+            await log_kyc_to_database_async(kyc_data)
             return {"status": "success", "data": kyc_data}
         else:
             raise HTTPException(status_code=400, detail=result)
@@ -99,56 +148,112 @@ async def client_funds_check_endpoint(
     bank_statement: UploadFile = File(...)
 ):
     # CRITICAL FIX: Save temporary file to /tmp directory
-    bank_path = os.path.join("/tmp", f"bank_{bank_statement.filename}")
+    # Unique per request: the check awaits Firestore, so concurrent uploads of the same name would otherwise overwrite each other.
+    bank_path = os.path.join("/tmp", f"bank_{uuid.uuid4().hex}_{os.path.basename(bank_statement.filename)}")
     try:
-        with open(bank_path, "wb") as buffer:
+        with metrics.stage("upload.copy_files"), open(bank_path, "wb") as buffer:
             shutil.copyfileobj(bank_statement.file, buffer)
-        result = check_client_funds_from_db(bank_path)
+        result = await check_client_funds_async(bank_path)
         return result
     finally:
         background_tasks.add_task(remove_file, bank_path)
 
+@app.post('/api/trades/ingest', tags=["Trades"])
+async def ingest_trades_endpoint(
+    background_tasks: BackgroundTasks,
+    trade_file: UploadFile = File(...),
+    dry_run: bool = Form(False)
+):
+    # CSV by default; .ndjson/.jsonl uploads are read as newline-delimited JSON.
+    # Bulk writes stay on the sync client in a worker thread: the pandas validation is CPU-bound
+    # and has to leave the event loop anyway, and the same code path serves the CLI and cron jobs.
+    # BatchWriter's thread pool already bounds in-flight commits.
+    # Unique per request so concurrent uploads of the same file name don't delete each other's copy.
+    trade_path = os.path.join("/tmp", f"trades_{uuid.uuid4().hex}_{os.path.basename(trade_file.filename)}")
+    try:
+        with metrics.stage("upload.copy_files"), open(trade_path, "wb") as buffer:
+            shutil.copyfileobj(trade_file.file, buffer)
+        summary, error = await asyncio.to_thread(ingest_trade_file, trade_path, kycchecker.db, dry_run=dry_run)
+        if error:
+            committed = f" {summary['rows_written']} row(s) were committed before the failure." if summary else ""
+            raise HTTPException(status_code=400, detail=f"Trade ingestion failed: {error}.{committed}")
+        return summary
+    finally:
+        background_tasks.add_task(remove_file, trade_path)
+
+@app.post('/api/risk/rescore', tags=["Risk"])
+async def rescore_risk_endpoint(full: bool = False, dry_run: bool = False):
+    # Incremental by default: only clients with new trades or KYC expiry changes since the last run are rescored.
+    # Like ingestion, this batch job uses the sync client in a worker thread: the scoring is pandas-bound and
+    # the same function backs `python -m KYC.risk_scoring`.
+    summary, error = await asyncio.to_thread(run_risk_scoring, kycchecker.db, full, dry_run)
+    if error:
+        raise HTTPException(status_code=500, detail=f"Risk scoring failed: {error}")
+    return summary
+
 @app.get('/api/reports/generate-margin-report', tags=["Reports"])
 async def generate_margin_report_endpoint():
-    report_path, error = generate_margin_report_from_db()
+    report_path, error = await generate_margin_report_async()
     if error:
         raise HTTPException(status_code=500, detail=f"Failed to generate report: {error}")
-    return FileResponse(path=report_path, filename=os.path.basename(report_path), background=BackgroundTasks([lambda: remove_file(report_path)]))
+    return report_response(report_path)
 
 @app.get('/api/surveillance/run-check', tags=["Surveillance"])
 async def run_surveillance_endpoint():
-    result, error = run_surveillance_checks_from_db()
+    result, error = await run_surveillance_checks_async()
     if error:
         raise HTTPException(status_code=500, detail=f"Surveillance check failed: {error}")
     pdf_path, pdf_error = generate_suspicious_trade_pdf(result.get("flagged_trades", []))
     if pdf_error:
         raise HTTPException(status_code=500, detail=f"Failed to generate PDF: {pdf_error}")
-    return FileResponse(path=pdf_path, filename=os.path.basename(pdf_path), background=BackgroundTasks([lambda: remove_file(pdf_path)]))
+    return report_response(pdf_path)
+
+@app.get('/api/surveillance/run-historical', tags=["Surveillance"])
+async def run_historical_surveillance_endpoint(lookback_days: int = 90, partition_days: int = 7):
+    if not 1 <= lookback_days <= MAX_LOOKBACK_DAYS:
+        raise HTTPException(status_code=400, detail=f"lookback_days must be between 1 and {MAX_LOOKBACK_DAYS}.")
+    if partition_days < 1:
+        raise HTTPException(status_code=400, detail="partition_days must be at least 1.")
+    end_date = date.today()
+    # Runs in a worker thread so the partition scan (and its process pool) doesn't block the event loop.
+    # Partitions are scanned in worker processes that open their own Firestore client.
+    result, error = await asyncio.to_thread(run_historical_surveillance, end_date - timedelta(days=lookback_days - 1), end_date, partition_days, **HISTORICAL_SCAN_OPTIONS)
+    if error:
+        raise HTTPException(status_code=500, detail=f"Historical surveillance failed: {error}")
+    pdf_path, pdf_error = generate_suspicious_trade_pdf(result.get("flagged_trades", []))
+    if pdf_error:
+        raise HTTPException(status_code=500, detail=f"Failed to generate PDF: {pdf_error}")
+    return report_response(pdf_path)
 
 @app.get('/api/compliance/run-quarterly-settlement', tags=["Compliance"])
 async def run_qs_endpoint():
-    result, error = run_quarterly_settlement_check()
+    result, error = await run_quarterly_settlement_check_async()
     if error:
         raise HTTPException(status_code=500, detail=f"Quarterly settlement check failed: {error}")
     pdf_path, pdf_error = generate_qs_report_pdf(result.get("settlement_due_clients", []))
     if pdf_error:
         raise HTTPException(status_code=500, detail=f"Failed to generate PDF: {pdf_error}")
-    return FileResponse(path=pdf_path, filename=os.path.basename(pdf_path), background=BackgroundTasks([lambda: remove_file(pdf_path)]))
+    return report_response(pdf_path)
 
 @app.get('/api/kyc/expiring', tags=["KYC"])
 async def get_expiring_kyc():
-    result, error = get_expiring_kyc_from_db()
+    result, error = await get_expiring_kyc_async()
     if error:
         raise HTTPException(status_code=500, detail=f"Database error: {error}")
     return result
 
 @app.post('/api/clients/notify', tags=["Clients"])
 async def notify_client_endpoint(request: NotifyClientRequest):
-    result, error = send_kyc_notification(request.client_id)
+    result, error = await send_kyc_notification_async(request.client_id)
     if error:
         raise HTTPException(status_code=404, detail=error)
     return result
 
+@app.get('/metrics', tags=["Monitoring"], response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Exposes stage latency histograms and counters in Prometheus text format."""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 if __name__ == '__main__':
     # Corrected uvicorn command for local running
     uvicorn.run("app:app", host="0.0.0.0", port=8080, reload=True)
\ No newline at end of file
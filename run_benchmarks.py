@@ -0,0 +1,293 @@
+import os
+import sys
+import json
+import time
+import argparse
+import asyncio
+import platform
+import tempfile
+import statistics
+from datetime import datetime, date, timedelta
+
+import numpy as np
+import pandas as pd
+
+import KYC.kycchecker as kyc
+from KYC.fake_firestore import FakeFirestore, FakeAsyncFirestore, seed_synthetic_data
+from KYC.async_db import (
+    scan_collection, set_async_db, log_kyc_to_database_async, generate_margin_report_async,
+    run_surveillance_checks_async, run_quarterly_settlement_check_async
+)
+from KYC.trade_ingest import ingest_trade_file
+from KYC.reconciliation import reconcile_statement
+from KYC.historical_surveillance import run_historical_surveillance, shutdown_worker_pools
+
+# --- CONFIGURATION ---
+TEST_FOLDER = "test"
+TEST_USER_ID = "u1"
+TEST_USER_NAME = "Abhyuday Rastogi"
+RESULTS_PATH = "bench_results.json"
+BASELINE_PATH = "bench_baseline.json"
+DEFAULT_TOLERANCE = 0.25  # Fail when a median is more than 25% slower than the baseline
+
+# Synthetic book sizes for the DB-backed benchmarks (clients, simulated days).
+SIZES = {
+    "small": {"num_clients": 50, "simulation_days": 30},
+    "medium": {"num_clients": 200, "simulation_days": 90},
+    "large": {"num_clients": 1000, "simulation_days": 180},
+}
+# Bank statement rows for the reconciliation benchmark at each size.
+STATEMENT_ROWS = {"small": 50_000, "medium": 500_000, "large": 3_000_000}
+
+SAMPLE_OCR_TEXT = (
+    "GOVERNMENT OF INDIA\nABHYUDAY RASTOGI\nDOB: 14/02/2003\nMale\n"
+    "Address: S/O Rakesh Rastogi, 12 Park Street, Lucknow, Uttar Pradesh - 226001\n"
+    "INCOME TAX DEPARTMENT\nPermanent Account Number\nABCDE1234F\n"
+)
+
+def time_call(func, repeats, setup=None):
+    """Runs `func` `repeats` times and returns timing stats in seconds."""
+    samples = []
+    for _ in range(repeats):
+        if setup: setup()
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "repeats": repeats, "min": samples[0], "median": statistics.median(samples),
+        "mean": statistics.fmean(samples), "p95": samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))],
+    }
+
+def check_result(result):
+    """The kycchecker functions return (value, error) tuples; a benchmark of an error path is useless."""
+    if isinstance(result, tuple) and len(result) == 2 and result[1]:
+        raise RuntimeError(result[1])
+    return result
+
+# --- BENCHMARK DEFINITIONS ---
+def bench_documents(repeats):
+    results = {}
+    paths = {kind: os.path.join(TEST_FOLDER, f"{TEST_USER_ID}_{kind}.jpg") for kind in ("selfie", "pan", "aadhaar_front", "aadhaar_back")}
+    for kind in ("pan", "aadhaar_front", "aadhaar_back"):
+        results[f"extract_text_from_image@{kind}"] = time_call(lambda: kyc.extract_text_from_image(paths[kind]), repeats)
+    results["process_local_kyc@u1"] = time_call(
+        lambda: kyc.process_local_kyc(paths["selfie"], paths["pan"], paths["aadhaar_front"], paths["aadhaar_back"], TEST_USER_NAME),
+        max(1, repeats // 3))
+    return results
+
+def bench_parsing(repeats):
+    results = {}
+    for multiplier in (1, 10, 100):
+        text = SAMPLE_OCR_TEXT * multiplier
+        results[f"parse_other_details@x{multiplier}"] = time_call(lambda: kyc.parse_other_details(text), repeats * 10)
+    return results
+
+def bench_database(size_name, repeats, latency):
+    """Times the async DB functions the API serves, against the in-memory store through FakeAsyncFirestore."""
+    fake_db = FakeFirestore(latency=latency)
+    counts = seed_synthetic_data(fake_db, **SIZES[size_name])
+    kyc.db = fake_db
+    set_async_db(FakeAsyncFirestore(fake_db))
+    print(f"  Seeded '{size_name}': {counts}")
+    loop = asyncio.new_event_loop()
+    run = lambda coroutine_function: check_result(loop.run_until_complete(coroutine_function()))
+    results = {}
+    results[f"run_surveillance_checks_async@{size_name}"] = time_call(lambda: run(run_surveillance_checks_async), repeats)
+    results[f"generate_margin_report_async@{size_name}"] = time_call(lambda: kyc.remove_report_file(run(generate_margin_report_async)[0]), repeats)
+    results[f"run_quarterly_settlement_check_async@{size_name}"] = time_call(lambda: run(run_quarterly_settlement_check_async), repeats)
+    kyc_data = {"Name": TEST_USER_NAME, "PAN Number": "ABCDE1234F", "Date of Birth": "14/02/2003", "Address": "12 Park Street, Lucknow"}
+    results[f"log_kyc_to_database_async@{size_name}"] = time_call(lambda: loop.run_until_complete(log_kyc_to_database_async(kyc_data)), repeats)
+
+    flagged, _ = run(run_surveillance_checks_async)
+    settlement, _ = run(run_quarterly_settlement_check_async)
+    loop.close()
+    flagged_trades = flagged["flagged_trades"] or [{"client_id": "CL1001", "stock_symbol": "INFY", "reason": "Large Trade Value"}]
+    due_clients = settlement["settlement_due_clients"] or [{"client_id": "CL1001", "full_name": "CLIENT 1001", "balance": 1.0, "days_since_last_trade": 91}]
+    # Scale the report rows with the book so PDF cost tracks the data size.
+    flagged_rows = (flagged_trades * (counts["clients"] // len(flagged_trades) + 1))[:counts["clients"]]
+    due_rows = (due_clients * (counts["clients"] // len(due_clients) + 1))[:counts["clients"]]
+    results[f"generate_suspicious_trade_pdf@{size_name}"] = time_call(lambda: kyc.remove_report_file(check_result(kyc.generate_suspicious_trade_pdf(flagged_rows))[0]), repeats)
+    results[f"generate_qs_report_pdf@{size_name}"] = time_call(lambda: kyc.remove_report_file(check_result(kyc.generate_qs_report_pdf(due_rows))[0]), repeats)
+    for key in results: results[key]["documents"] = counts
+    return results
+
+def bench_reconciliation(size_name, repeats):
+    """Reconciles a synthetic multi-account, multi-day statement (one account per client)."""
+    rows, num_clients = STATEMENT_ROWS[size_name], SIZES[size_name]["num_clients"]
+    rng = np.random.default_rng(42)
+    client_ids = np.array([f"CL{1001 + i}" for i in range(num_clients)])
+    days = np.array([(date.today() - timedelta(days=d)).isoformat() for d in range(90)])
+    picked = rng.integers(0, num_clients, size=rows)
+    statement = pd.DataFrame({
+        'date': days[rng.integers(0, len(days), size=rows)], 'account_id': np.char.add("AC-", client_ids[picked]),
+        'client_id': client_ids[picked], 'balance': np.round(rng.uniform(50000, 200000, size=rows), 2),
+    })
+    ledger_df = pd.DataFrame({'client_id': client_ids, 'balance': np.round(rng.uniform(50000, 200000, size=num_clients), 2)})
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "statement.csv")
+        statement.to_csv(path, index=False)
+        del statement
+        outcomes = []
+        stats = time_call(lambda: outcomes.append(reconcile_statement(path, ledger_df)), repeats)
+    stats["rows"] = rows
+    stats["rows_per_sec"] = round(rows / stats["median"], 1)
+    print(f"  Reconciled {rows:,} rows at {stats['rows_per_sec']:,.0f} rows/sec ({len(outcomes[-1]['client_exceptions'])} exceptions)")
+    return {f"reconcile_statement@{size_name}": stats}
+
+def _inherited_db():
+    # Forked benchmark workers inherit the seeded in-memory store from the parent.
+    return kyc.db
+
+def bench_historical(size_name, repeats, latency):
+    """Scans the whole simulated history sequentially, then across a fork-based process pool."""
+    kyc.db = FakeFirestore(latency=latency)
+    seed_synthetic_data(kyc.db, **SIZES[size_name])
+    days = SIZES[size_name]["simulation_days"]
+    start_date, end_date = date.today() - timedelta(days=days), date.today()
+    results = {}
+    try:
+        for workers in sorted({1, os.cpu_count() or 1}):
+            run = lambda: check_result(run_historical_surveillance(start_date, end_date, max_workers=workers, db_factory=_inherited_db, mp_context="fork"))
+            results[f"run_historical_surveillance@{size_name}/workers={workers}"] = time_call(run, repeats)
+    finally:
+        shutdown_worker_pools()  # Forked workers hold this size's store; the next size reseeds
+    return results
+
+def _emulator_clients(size_name):
+    """Seeds the Firestore emulator (FIRESTORE_EMULATOR_HOST) and returns real sync/async clients."""
+    import firebase_admin
+    from firebase_admin import firestore, firestore_async
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(options={"projectId": os.environ.get("GCLOUD_PROJECT", "kyc-benchmarks")})
+    sync_db, async_db = firestore.client(), firestore_async.client()
+    staged = FakeFirestore()
+    seed_synthetic_data(staged, **SIZES[size_name])
+    for collection in ("clients", "client_balances"):
+        docs = list(staged._store[collection].items())
+        for i in range(0, len(docs), 400):
+            batch = sync_db.batch()
+            for doc_id, data in docs[i:i + 400]: batch.set(sync_db.collection(collection).document(doc_id), data)
+            batch.commit()
+    return sync_db, async_db
+
+def bench_scans(size_name, repeats, latency, field_latency, emulator):
+    """Full-collection scans: sync single stream of whole documents vs async partitioned, projected scans."""
+    if emulator:
+        sync_db, async_db = _emulator_clients(size_name)
+    else:
+        sync_db = FakeFirestore(latency=latency, field_latency=field_latency)
+        seed_synthetic_data(sync_db, **SIZES[size_name])
+        async_db = FakeAsyncFirestore(sync_db)
+    results = {}
+    loop = asyncio.new_event_loop()
+    for collection, fields in (("client_balances", ["balance"]), ("clients", ["full_name", "kyc_expiry_date"])):
+        documents = len(list(sync_db.collection(collection).select([]).stream()))
+        before = time_call(lambda: list(sync_db.collection(collection).stream()), repeats)
+        after = time_call(lambda: loop.run_until_complete(scan_collection(async_db, collection, fields=fields)), repeats)
+        for label, stats in (("sync_full", before), ("async_partitioned", after)):
+            stats["documents"] = documents
+            stats["docs_per_sec"] = round(documents / stats["median"], 1) if stats["median"] else None
+            results[f"scan_{collection}@{size_name}/{label}"] = stats
+        print(f"  {collection}: {before['docs_per_sec']:,.0f} -> {after['docs_per_sec']:,.0f} docs/sec")
+    loop.close()
+    return results
+
+def bench_ingest(size_name, repeats, latency):
+    """Ingests a synthetic trade CSV (a tenth of the statement rows for the size) into a fresh store each run."""
+    rows, num_clients = STATEMENT_ROWS[size_name] // 10, SIZES[size_name]["num_clients"]
+    rng = np.random.default_rng(7)
+    trades = pd.DataFrame({
+        'client_id': np.char.add("CL", rng.integers(1001, 1001 + num_clients, size=rows).astype(str)),
+        'stock_symbol': rng.choice(["RELIANCE", "TCS", "HDFCBANK", "INFY"], size=rows), 'trade_type': rng.choice(["BUY", "SELL"], size=rows),
+        'quantity': rng.integers(10, 500, size=rows), 'price_per_share': np.round(rng.uniform(100, 3000, size=rows), 2),
+        'trade_date': (pd.Timestamp(date.today()) - pd.to_timedelta(rng.integers(0, 30, size=rows), unit='D')).strftime('%Y-%m-%d'),
+    })
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "trades.csv")
+        trades.to_csv(path, index=False)
+        stats = time_call(lambda: check_result(ingest_trade_file(path, FakeFirestore(latency=latency))), repeats)
+    stats["rows"] = rows
+    stats["rows_per_sec"] = round(rows / stats["median"], 1)
+    print(f"  Ingested {rows:,} trades at {stats['rows_per_sec']:,.0f} rows/sec")
+    return {f"ingest_trade_file@{size_name}": stats}
+
+# --- BASELINE COMPARISON ---
+def compare_to_baseline(results, baseline, tolerance):
+    regressions = []
+    for name, stats in results.items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if not previous: continue
+        ratio = stats["median"] / previous["median"] if previous["median"] else 1.0
+        stats["baseline_median"] = previous["median"]
+        stats["ratio_to_baseline"] = round(ratio, 3)
+        if ratio > 1 + tolerance:
+            regressions.append((name, previous["median"], stats["median"], ratio))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for the kycchecker hot paths against an in-memory Firestore.")
+    parser.add_argument("--sizes", default="small,medium", help=f"Comma-separated sizes from: {', '.join(SIZES)}")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated Firestore round-trip latency in seconds.")
+    parser.add_argument("--field-latency", type=float, default=0.0, help="Simulated transfer cost (s) per field returned by a scan.")
+    parser.add_argument("--emulator", action="store_true", help="Run the scan benchmarks against the Firestore emulator (FIRESTORE_EMULATOR_HOST).")
+    parser.add_argument("--skip-ml", action="store_true", help="Skip the OCR and DeepFace benchmarks.")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="Write this run's results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    results = {}
+    print("--- Running parser benchmarks ---")
+    results.update(bench_parsing(args.repeats))
+    if not args.skip_ml:
+        print("--- Running OCR / face verification benchmarks ---")
+        results.update(bench_documents(args.repeats))
+    original_db = kyc.db
+    try:
+        for size_name in [s.strip() for s in args.sizes.split(",") if s.strip()]:
+            if size_name not in SIZES:
+                print(f"❌ ERROR: Unknown size '{size_name}'.")
+                return 2
+            print(f"--- Running database benchmarks ({size_name}) ---")
+            results.update(bench_database(size_name, args.repeats, args.latency))
+            results.update(bench_reconciliation(size_name, max(1, args.repeats // 2)))
+            results.update(bench_historical(size_name, max(1, args.repeats // 2), args.latency))
+            results.update(bench_scans(size_name, args.repeats, args.latency, args.field_latency, args.emulator))
+            results.update(bench_ingest(size_name, max(1, args.repeats // 2), args.latency))
+    finally:
+        kyc.db = original_db
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f: baseline = json.load(f)
+    regressions = compare_to_baseline(results, baseline, args.tolerance) if baseline else []
+
+    report = {
+        "created_at": datetime.now().isoformat(), "python": platform.python_version(), "machine": platform.machine(),
+        "latency": args.latency, "tolerance": args.tolerance, "benchmarks": results,
+    }
+    with open(args.output, "w") as f: json.dump(report, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w") as f: json.dump(report, f, indent=2)
+
+    print("\n" + "=" * 72)
+    for name, stats in results.items():
+        line = f"{name:<50} median {stats['median'] * 1000:10.3f} ms"
+        if "ratio_to_baseline" in stats: line += f"  ({stats['ratio_to_baseline']:.2f}x baseline)"
+        print(line)
+    print("=" * 72)
+    print(f"Results written to {args.output}" + (f" and {args.baseline}" if args.update_baseline else ""))
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}:")
+        for name, before, after, ratio in regressions:
+            print(f"  {name}: {before * 1000:.3f} ms -> {after * 1000:.3f} ms ({ratio:.2f}x)")
+        return 1
+    if baseline: print("\n✅ No regressions against the baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import functools
+import argparse
+import threading
+
+import httpx
+
+# --- CONFIGURATION ---
+DEFAULT_BASE_URL = "http://127.0.0.1:8080"
+DEFAULT_SPECS = os.path.join("loadtest", "requests.jsonl")
+TEST_FOLDER = "test"
+KYC_DOCUMENTS = ("selfie", "pan", "aadhaar_front", "aadhaar_back")
+
+def load_specs(path):
+    """
+    Reads one request spec per line. A spec has a method and path plus optional
+    `data` (form fields), `json`, `files` ({field: path}) and `weight`. `kyc_user`
+    expands to that user's four documents from the test folder, like run_kyc_test.py.
+    Lines without a path (e.g. other JSONL content) are skipped.
+    """
+    specs = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip(): continue
+            spec = json.loads(line)
+            if "path" not in spec: continue
+            spec.setdefault("method", "GET")
+            spec.setdefault("name", f"{spec['method']} {spec['path']}")
+            spec.setdefault("weight", 1)
+            files = dict(spec.get("files", {}))
+            if "kyc_user" in spec:
+                for key in KYC_DOCUMENTS:
+                    files[key] = os.path.join(TEST_FOLDER, f"{spec['kyc_user']}_{key}.jpg")
+            for key, file_path in files.items():
+                if not os.path.exists(file_path):
+                    raise FileNotFoundError(f"Spec on line {line_number} needs '{key}' at {file_path}")
+            # Read uploads once so the generator measures the server, not the local disk.
+            spec["_files"] = {key: (os.path.basename(p), open(p, "rb").read()) for key, p in files.items()}
+            specs.append(spec)
+    return specs
+
+def percentile(sorted_values, pct):
+    if not sorted_values: return None
+    # Nearest-rank: the smallest value with at least pct% of samples at or below it.
+    index = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+# --- LOAD GENERATION ---
+async def send(client, spec, results, scheduled_at):
+    """Sends one request. Latency is measured from the scheduled arrival so queueing delay counts."""
+    kwargs = {}
+    if spec.get("data"): kwargs["data"] = spec["data"]
+    if spec.get("json") is not None: kwargs["json"] = spec["json"]
+    if spec["_files"]: kwargs["files"] = {key: (name, content) for key, (name, content) in spec["_files"].items()}
+    status = None
+    try:
+        response = await client.request(spec["method"], spec["path"], **kwargs)
+        await response.aread()
+        status = response.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    results.append((spec["name"], status, time.perf_counter() - scheduled_at))
+
+async def run_load(base_url, specs, concurrency, rate, duration, total_requests, timeout, seed):
+    rng = random.Random(seed)
+    weights = [spec["weight"] for spec in specs]
+    results = []
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def guarded(client, spec, scheduled_at):
+        async with semaphore:
+            await send(client, spec, results, scheduled_at)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        tasks = []
+        sent = 0
+        if rate > 0:
+            # Open loop: Poisson arrivals at `rate` req/s regardless of how fast responses come back.
+            next_arrival = start
+            while (total_requests and sent < total_requests) or (not total_requests and next_arrival - start < duration):
+                delay = next_arrival - time.perf_counter()
+                if delay > 0: await asyncio.sleep(delay)
+                spec = rng.choices(specs, weights)[0]
+                tasks.append(asyncio.create_task(guarded(client, spec, next_arrival)))
+                sent += 1
+                next_arrival += rng.expovariate(rate)
+            await asyncio.gather(*tasks)
+        else:
+            # Closed loop: `concurrency` workers each send their next request as soon as the last returns.
+            async def worker():
+                nonlocal sent
+                while (total_requests and sent < total_requests) or (not total_requests and time.perf_counter() - start < duration):
+                    sent += 1
+                    await send(client, rng.choices(specs, weights)[0], results, time.perf_counter())
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return results, elapsed
+
+def summarize(results, elapsed):
+    by_endpoint = {}
+    for name, status, latency in results:
+        by_endpoint.setdefault(name, []).append((status, latency))
+    summary = {}
+    for name, samples in sorted(by_endpoint.items()):
+        latencies = sorted(latency for _, latency in samples)
+        errors = sum(1 for status, _ in samples if not isinstance(status, int) or status >= 400)
+        summary[name] = {
+            "requests": len(samples), "errors": errors, "error_rate": errors / len(samples),
+            "rps": len(samples) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 50) * 1000, "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+        }
+    return summary
+
+# --- LOCAL SERVER BACKED BY THE IN-MEMORY FIRESTORE ---
+def start_local_server(port, num_clients, simulation_days, latency):
+    import uvicorn
+    import KYC.kycchecker as kyc
+    from KYC.async_db import set_async_db
+    from KYC.fake_firestore import FakeFirestore, FakeAsyncFirestore, seed_synthetic_data, seeded_firestore
+    from app import app, HISTORICAL_SCAN_OPTIONS
+
+    kyc.db = FakeFirestore(latency=latency)
+    set_async_db(FakeAsyncFirestore(kyc.db))
+    counts = seed_synthetic_data(kyc.db, num_clients=num_clients, simulation_days=simulation_days)
+    # Historical surveillance workers are separate processes; each seeds an identical copy.
+    HISTORICAL_SCAN_OPTIONS["db_factory"] = functools.partial(seeded_firestore, latency, num_clients=num_clients, simulation_days=simulation_days)
+    print(f"Seeded in-memory Firestore: {counts}")
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive(): raise RuntimeError("Local server failed to start.")
+        time.sleep(0.05)
+    return server, thread
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent HTTP load generator for the KYC & Compliance API.")
+    parser.add_argument("--specs", default=DEFAULT_SPECS, help="JSONL file of request specs to replay.")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--concurrency", type=int, default=16, help="Maximum requests in flight.")
+    parser.add_argument("--rate", type=float, default=20.0, help="Open-loop arrival rate in req/s (0 = closed loop).")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to generate load for.")
+    parser.add_argument("--requests", type=int, default=0, help="Stop after this many requests instead of --duration.")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--endpoints", default="", help="Comma-separated spec names to include (default: all).")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--serve", action="store_true", help="Start app.py locally against a seeded in-memory Firestore.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--clients", type=int, default=200, help="Clients to seed when using --serve.")
+    parser.add_argument("--days", type=int, default=90, help="Days of trade history to seed when using --serve.")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="Simulated Firestore latency (s) when using --serve.")
+    parser.add_argument("--output", help="Optional path for the JSON summary.")
+    args = parser.parse_args()
+
+    specs = load_specs(args.specs)
+    if args.endpoints:
+        wanted = {name.strip() for name in args.endpoints.split(",")}
+        specs = [spec for spec in specs if spec["name"] in wanted]
+    if not specs:
+        print(f"❌ ERROR: No request specs found in {args.specs}.")
+        return 2
+
+    server = None
+    base_url = args.base_url
+    if args.serve:
+        server, thread = start_local_server(args.port, args.clients, args.days, args.db_latency)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    mode = f"open loop at {args.rate:g} req/s" if args.rate > 0 else "closed loop"
+    print(f"--- Load test against {base_url}: {len(specs)} spec(s), concurrency {args.concurrency}, {mode} ---")
+    try:
+        results, elapsed = asyncio.run(run_load(base_url, specs, args.concurrency, args.rate, args.duration, args.requests, args.timeout, args.seed))
+    finally:
+        if server:
+            server.should_exit = True
+            thread.join(timeout=10)
+
+    if not results:
+        print("❌ ERROR: No requests completed.")
+        return 1
+    summary = summarize(results, elapsed)
+    total_errors = sum(s["errors"] for s in summary.values())
+    print("\n" + "=" * 96)
+    print(f"{'Endpoint':<24}{'Reqs':>7}{'Err %':>8}{'Req/s':>9}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}")
+    print("=" * 96)
+    for name, s in summary.items():
+        print(f"{name:<24}{s['requests']:>7}{s['error_rate'] * 100:>7.1f}%{s['rps']:>9.2f}{s['p50_ms']:>12.1f}{s['p95_ms']:>12.1f}{s['p99_ms']:>12.1f}")
+    print("=" * 96)
+    print(f"Total: {len(results)} requests in {elapsed:.1f}s ({len(results) / elapsed:.2f} req/s), {total_errors} error(s)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"base_url": base_url, "concurrency": args.concurrency, "rate": args.rate, "elapsed": elapsed, "endpoints": summary}, f, indent=2)
+        print(f"Summary written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
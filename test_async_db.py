@@ -0,0 +1,50 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+pytest.importorskip("deepface")  # KYC.async_db imports kycchecker and its OCR/face stack
+from KYC.async_db import scan_collection, set_async_db, run_quarterly_settlement_check_async
+from KYC.fake_firestore import FakeFirestore, FakeAsyncFirestore, DESCENDING, seed_synthetic_data
+
+def test_partitioned_scan_returns_each_document_once():
+    db = FakeFirestore()
+    for i in range(37):
+        db.collection('client_balances').document(f"CL{1001 + i}").set({'balance': float(i)})
+    expected = sorted(db._store['client_balances'])
+    for partitions in (1, 2, 3, 8, 50):
+        docs = asyncio.run(scan_collection(FakeAsyncFirestore(db), 'client_balances', fields=['balance'], partitions=partitions))
+        assert sorted(doc.id for doc in docs) == expected, partitions
+        assert all(set(doc.to_dict()) == {'balance'} for doc in docs)
+
+def _quarterly_settlement_reference(db):
+    """The check as it ran before the async client: one last-trade query and one client read per funded client."""
+    ninety_days_ago = datetime.now() - timedelta(days=90)
+    due = []
+    for bal_doc in db.collection('client_balances').where('balance', '>', 0).stream():
+        trades = db.collection('trades').where('client_id', '==', bal_doc.id).order_by('trade_date', direction=DESCENDING).limit(1).stream()
+        last_trade = next(iter(trades), None)
+        if last_trade and last_trade.to_dict()['trade_date'] < ninety_days_ago:
+            client_doc = db.collection('clients').document(bal_doc.id).get()
+            if client_doc.exists:
+                due.append((bal_doc.id, client_doc.to_dict().get('full_name'), bal_doc.to_dict()['balance'], (datetime.now() - last_trade.to_dict()['trade_date']).days))
+    return sorted(due)
+
+def test_quarterly_settlement_matches_sequential_check():
+    db = FakeFirestore()
+    seed_synthetic_data(db, num_clients=40, simulation_days=30)
+    # Move four clients' trades back past the 90-day idle threshold.
+    idle_clients = sorted(db._store['clients'])[:4]
+    for trade in db._store['trades'].values():
+        if trade['client_id'] in idle_clients: trade['trade_date'] -= timedelta(days=120)
+    db._touch('trades')
+    expected = _quarterly_settlement_reference(db)
+    assert len(expected) == 4
+    # Funded clients without a client document, or with no balance, are left out.
+    del db._store['clients'][expected[0][0]]
+    db._store['client_balances'][expected[1][0]]['balance'] = 0
+    expected = expected[2:]
+
+    set_async_db(FakeAsyncFirestore(db))
+    result, error = asyncio.run(run_quarterly_settlement_check_async())
+    assert error is None
+    actual = sorted((c["client_id"], c["full_name"], c["balance"], c["days_since_last_trade"]) for c in result["settlement_due_clients"])
+    assert actual == expected
@@ -0,0 +1,70 @@
+from datetime import date, datetime, timedelta
+from functools import partial
+import pandas as pd
+from KYC import historical_surveillance
+from KYC.fake_firestore import FakeFirestore, seed_synthetic_data, seeded_firestore
+from KYC.historical_surveillance import (
+    TRADE_FIELDS, HIGH_FREQUENCY_TRADES, WASH_TRADE_MIN_TRADES,
+    date_partitions, evaluate_trades, merge_partitions, run_historical_surveillance, shutdown_worker_pools
+)
+
+def _trades(day, client_id, symbol, trade_types, quantity=10, price=100.0):
+    when = datetime.combine(day, datetime.min.time())
+    return pd.DataFrame([[client_id, symbol, trade_type, quantity, price, when] for trade_type in trade_types], columns=TRADE_FIELDS)
+
+def test_date_partitions_cover_range_without_gaps():
+    start, end = date(2024, 1, 1), date(2024, 1, 10)
+    bounds = date_partitions(start, end, partition_days=7)
+    assert bounds == [
+        (datetime(2024, 1, 1), datetime(2024, 1, 8)),
+        (datetime(2024, 1, 8), datetime(2024, 1, 11)),
+    ]
+    assert date_partitions(start, start, partition_days=7) == [(datetime(2024, 1, 1), datetime(2024, 1, 2))]
+
+def test_merge_partitions_sums_rules_across_partitions():
+    day = date(2024, 1, 5)
+    # One busy day split across two partitions: neither half crosses the threshold alone.
+    half = HIGH_FREQUENCY_TRADES // 2 + 1
+    first = evaluate_trades(_trades(day, "CL1001", "TCS", ["BUY"] * half))
+    second = evaluate_trades(_trades(day, "CL1001", "TCS", ["BUY"] * half))
+    assert merge_partitions([first]) == []
+    flags = merge_partitions([first, second])
+    assert [(f["client_id"], f["reason"], f["occurrences"]) for f in flags] == [("CL1001", "High Frequency Trading", 1)]
+
+    # Matched buys and sells on different days only look like wash trading over the whole window.
+    buys = evaluate_trades(_trades(date(2024, 1, 1), "CL1002", "INFY", ["BUY"] * (WASH_TRADE_MIN_TRADES // 2)))
+    sells = evaluate_trades(_trades(date(2024, 1, 9), "CL1002", "INFY", ["SELL"] * (WASH_TRADE_MIN_TRADES // 2)))
+    wash = [f for f in merge_partitions([buys, sells]) if f["reason"] == "Possible Wash Trading"]
+    assert len(wash) == 1 and wash[0]["last_seen"] == "2024-01-09"
+
+def test_single_worker_path_without_db_uses_factory():
+    db = FakeFirestore()
+    seed_synthetic_data(db, num_clients=20, simulation_days=10)
+    end = date.today()
+    # A 7-day lookback is one partition, so this takes the in-process path.
+    result, error = run_historical_surveillance(end - timedelta(days=6), end, partition_days=7, db_factory=lambda: db)
+    assert error is None
+    assert result["workers"] == 1 and result["partitions"] == 1 and result["trades_scanned"] > 0
+
+    explicit, error = run_historical_surveillance(end - timedelta(days=6), end, max_workers=1, db=db)
+    assert error is None and explicit["flagged_trades"] == result["flagged_trades"]
+
+def test_parallel_scan_reuses_its_pool_and_matches_in_process_scan():
+    factory = partial(seeded_firestore, num_clients=20, simulation_days=30)
+    end = date.today()
+    start = end - timedelta(days=29)
+    try:
+        first, error = run_historical_surveillance(start, end, partition_days=7, max_workers=2, db_factory=factory)
+        assert error is None and first["workers"] == 2 and first["partitions"] == 5
+        second, error = run_historical_surveillance(start, end, partition_days=7, max_workers=2, db_factory=factory)
+        assert error is None and len(historical_surveillance._pools) == 1
+    finally:
+        shutdown_worker_pools()
+    in_process, error = run_historical_surveillance(start, end, partition_days=7, max_workers=1, db=factory())
+    assert in_process["trades_scanned"] == first["trades_scanned"] == second["trades_scanned"]
+    assert in_process["flagged_trades"] == first["flagged_trades"]
+
+def test_db_with_worker_processes_is_rejected():
+    end = date.today()
+    result, error = run_historical_surveillance(end - timedelta(days=29), end, partition_days=7, max_workers=2, db=FakeFirestore())
+    assert result is None and "db_factory" in error
@@ -0,0 +1,58 @@
+import json
+import pytest
+from KYC import metrics
+
+@pytest.fixture(autouse=True)
+def _clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+def test_render_prometheus_histograms_are_cumulative_and_labels_escaped():
+    metrics.observe("kyc_stage_duration_seconds", 0.02, stage='ocr "pan"\\x\ny')
+    metrics.observe("kyc_stage_duration_seconds", 3.0, stage='ocr "pan"\\x\ny')
+    lines = metrics.render_prometheus().splitlines()
+    label = 'stage="ocr \\"pan\\"\\\\x\\ny"'
+    assert lines[:2] == ["# HELP kyc_stage_duration_seconds Time spent in each KYC/compliance processing stage.", "# TYPE kyc_stage_duration_seconds histogram"]
+    assert f'kyc_stage_duration_seconds_bucket{{{label},le="0.01"}} 0' in lines
+    assert f'kyc_stage_duration_seconds_bucket{{{label},le="0.025"}} 1' in lines
+    assert f'kyc_stage_duration_seconds_bucket{{{label},le="2.5"}} 1' in lines
+    assert f'kyc_stage_duration_seconds_bucket{{{label},le="5.0"}} 2' in lines
+    assert f'kyc_stage_duration_seconds_bucket{{{label},le="+Inf"}} 2' in lines
+    assert f'kyc_stage_duration_seconds_count{{{label}}} 2' in lines
+    assert f'kyc_stage_duration_seconds_sum{{{label}}} 3.02' in lines
+
+def test_stage_counts_errors_and_still_times_the_block():
+    with pytest.raises(ValueError):
+        with metrics.stage("ocr.pan"):
+            raise ValueError("unreadable")
+    with metrics.stage("ocr.pan"):
+        pass
+    text = metrics.render_prometheus()
+    assert 'kyc_stage_errors_total{stage="ocr.pan"} 1\n' in text
+    assert 'kyc_stage_duration_seconds_count{stage="ocr.pan"} 2\n' in text
+
+def test_trace_log_keeps_only_requests_slower_than_threshold(tmp_path, monkeypatch):
+    log = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(metrics, "TRACE_LOG", str(log))
+    monkeypatch.setattr(metrics, "TRACE_SLOW_MS", 100.0)
+    for path, elapsed in (("/fast", 0.05), ("/slow", 0.2)):
+        token = metrics.start_trace("GET", path)
+        with metrics.stage("db.lookup"):
+            pass
+        metrics.finish_trace(token, 200, elapsed)
+    traces = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [t["path"] for t in traces] == ["/slow"] and traces[0]["stages"][0]["stage"] == "db.lookup"
+    # Both requests are still counted in the metrics.
+    assert 'kyc_http_requests_total{method="GET",path="/fast",status="200"} 1' in metrics.render_prometheus()
+
+def test_unknown_paths_share_the_unmatched_label():
+    pytest.importorskip("deepface")  # app imports kycchecker and its OCR/face stack
+    from fastapi.testclient import TestClient
+    from app import app
+    client = TestClient(app)
+    for path in ("/wp-login.php", "/.env"):
+        assert client.get(path).status_code == 404
+    text = client.get("/metrics").text
+    assert 'kyc_http_requests_total{method="GET",path="unmatched",status="404"} 2' in text
+    assert "wp-login" not in text
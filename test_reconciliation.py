@@ -0,0 +1,42 @@
+import pandas as pd
+from KYC.reconciliation import reconcile_statement
+
+STATEMENT = """date,account_id,client_id,balance
+2024-01-01,AC-1,CL1001,100
+2024-01-01,AC-1,CL1001,150
+2024-01-02,AC-1,CL1001,"1,200.50"
+2024-01-02,AC-2,CL1002,300
+2024-01-02,AC-1,CL1001,90
+2024-01-02,AC-2,CL1002,not-a-number
+"""
+
+def _statement(tmp_path):
+    path = tmp_path / "statement.csv"
+    path.write_text(STATEMENT)
+    return str(path)
+
+def test_closing_balance_follows_statement_order_across_chunks(tmp_path):
+    ledger = pd.DataFrame({'client_id': ['CL1001', 'CL1002'], 'balance': [100.0, 300.0]})
+    oldest = reconcile_statement(_statement(tmp_path), ledger, chunksize=2)
+    assert oldest["daily"] == [{'date': '2024-01-01', 'bank_balance': 150.0}, {'date': '2024-01-02', 'bank_balance': 390.0}]
+    assert oldest["as_of"] == '2024-01-02' and oldest["status"] == 'FAIL' and oldest["shortfall"] == '10.00'
+    assert [e["client_id"] for e in oldest["client_exceptions"]] == ['CL1001']
+    assert oldest["rows_rejected"] == 1
+
+    newest = reconcile_statement(_statement(tmp_path), ledger, chunksize=2, statement_order='newest_first')
+    assert newest["daily"][-1] == {'date': '2024-01-02', 'bank_balance': 1500.5}
+    assert newest["status"] == 'PASS' and newest["client_exceptions"] == []
+
+def test_statement_without_date_or_account_uses_first_row(tmp_path):
+    path = tmp_path / "statement.csv"
+    path.write_text("balance\n1000\n10\n")
+    ledger = pd.DataFrame({'client_id': ['CL1001'], 'balance': [500.0]})
+    result = reconcile_statement(str(path), ledger)
+    assert result["status"] == 'PASS' and result["surplus"] == '500.00'
+
+def test_mixed_date_formats_collapse_to_one_day(tmp_path):
+    path = tmp_path / "statement.csv"
+    path.write_text("date,account_id,balance\n2024-01-02,AC-1,100\n01/02/2024,AC-1,250\n")
+    result = reconcile_statement(str(path), pd.DataFrame({'client_id': ['CL1001'], 'balance': [200.0]}))
+    assert result["daily"] == [{'date': '2024-01-02', 'bank_balance': 250.0}]
+    assert result["rows_rejected"] == 0 and result["status"] == 'PASS'
@@ -0,0 +1,36 @@
+import asyncio
+import pytest
+from datetime import date, datetime, timedelta, timezone
+from KYC.fake_firestore import FakeFirestore, FakeAsyncFirestore, seed_synthetic_data
+from KYC.risk_scoring import JOB_STATE_DOC, run_risk_scoring, score_new_client
+
+def test_new_clients_are_scored_from_kyc_fields():
+    complete = score_new_client({'client_id': 'CL2001', 'pan_number': 'ABCDE1234F', 'address': '12 Park Street', 'kyc_expiry_date': '2099-01-01'})
+    assert complete['risk_category'] == 'Low' and complete['risk_score'] == 0
+    incomplete = score_new_client({'client_id': 'CL2002', 'pan_number': 'N/A', 'address': '12 Park Street', 'kyc_expiry_date': '2099-01-01'})
+    assert incomplete['risk_score'] == 1 and incomplete['risk_features']['trade_count'] == 0
+
+def test_onboarding_writes_risk_fields():
+    pytest.importorskip("deepface")  # KYC.async_db imports kycchecker and its OCR/face stack
+    from KYC.async_db import set_async_db, log_kyc_to_database_async
+    db = FakeFirestore()
+    set_async_db(FakeAsyncFirestore(db))
+    asyncio.run(log_kyc_to_database_async({"Name": "TEST CLIENT", "PAN Number": "ABCDE1234F", "Address": "12 Park Street"}))
+    client = db._store['clients']['CL1001']
+    assert client['risk_category'] == 'Low' and 'risk_scored_at' in client
+
+def test_incremental_run_picks_up_kyc_entering_expiry_window():
+    db = FakeFirestore()
+    seed_synthetic_data(db, num_clients=20, simulation_days=10)
+    summary, error = run_risk_scoring(db)
+    assert error is None and summary['mode'] == 'full'
+
+    # Pretend the last run was ten days ago, when this client's KYC was still 35 days from expiry.
+    db.collection(JOB_STATE_DOC[0]).document(JOB_STATE_DOC[1]).set({'last_run_at': datetime.now(timezone.utc) - timedelta(days=10)})
+    client_id = sorted(db._store['clients'])[0]
+    db._store['clients'][client_id]['kyc_expiry_date'] = (date.today() + timedelta(days=25)).isoformat()
+    before = db._store['clients'][client_id]['risk_score']
+
+    summary, error = run_risk_scoring(db)
+    assert error is None and summary['mode'] == 'incremental'
+    assert db._store['clients'][client_id]['risk_score'] == before + 1
@@ -0,0 +1,50 @@
+from KYC.fake_firestore import FakeFirestore
+from KYC.trade_ingest import ingest_trade_file
+
+HEADER = "trade_id,client_id,stock_symbol,trade_type,quantity,price_per_share,trade_date"
+ROWS = [f"TRD{i},CL{1001 + i % 3},TCS,BUY,10,100.0,2024-01-0{1 + i % 5}" for i in range(31)]
+
+def _write(path, rows):
+    path.write_text("\n".join([HEADER] + rows) + "\n")
+    return str(path)
+
+def _totals(db):
+    stats = db._store.get('client_trade_stats', {}).values()
+    daily = db._store.get('client_daily_notional', {}).values()
+    return len(db._store.get('trades', {})), sum(s['trade_count'] for s in stats), sum(d['trade_count'] for d in daily)
+
+def test_failed_ingest_then_corrected_file_does_not_double_count(tmp_path):
+    db = FakeFirestore()
+    broken = list(ROWS)
+    broken[25] += ",extra,columns"  # Tokenizing error in the third chunk
+    summary, error = ingest_trade_file(_write(tmp_path / "bad.csv", broken), db, chunksize=10, batch_ops=12)
+    assert error and summary["status"] == "failed"
+    # Only whole chunks before the error are committed, trades and aggregates together.
+    assert summary["rows_written"] == 20 and _totals(db) == (20, 20, 20)
+
+    summary, error = ingest_trade_file(_write(tmp_path / "good.csv", ROWS), db, chunksize=10, batch_ops=12)
+    assert error is None and summary["rows_written"] == 11 and summary["rows_duplicate"] == 20
+    assert _totals(db) == (31, 31, 31)
+    assert db._store['trades']['TRD0']['trade_id'] == "TRD0"
+
+def test_duplicate_and_invalid_trade_ids_are_rejected(tmp_path):
+    rows = ROWS[:3] + [ROWS[0], "A/B,CL1001,TCS,BUY,10,100.0,2024-01-01"]
+    summary, error = ingest_trade_file(_write(tmp_path / "trades.csv", rows), None, chunksize=2, dry_run=True)
+    assert error is None and summary["rows_rejected"] == 2
+    assert {s["reject_reason"] for s in summary["rejected_samples"]} == {"duplicate trade_id", "invalid trade_id"}
+
+def test_reingesting_an_appended_file_writes_only_the_new_trades(tmp_path):
+    db = FakeFirestore()
+    summary, error = ingest_trade_file(_write(tmp_path / "day.csv", ROWS[:5]), db)
+    assert error is None and summary["rows_written"] == 5
+    appended = ROWS[:5] + ["TRD99,CL1001,TCS,BUY,10,100.0,2024-01-01"]
+    summary, error = ingest_trade_file(_write(tmp_path / "day.csv", appended), db)
+    assert error is None and summary["status"] == "success"
+    assert summary["rows_written"] == 1 and summary["rows_duplicate"] == 5
+    assert 'TRD99' in db._store['trades'] and _totals(db) == (6, 6, 6)
+
+def test_batch_ops_outside_the_firestore_limits_are_rejected(tmp_path):
+    path = _write(tmp_path / "trades.csv", ROWS[:5])
+    for batch_ops in (4, 501):
+        summary, error = ingest_trade_file(path, FakeFirestore(), batch_ops=batch_ops)
+        assert summary is None and "batch_ops" in error